@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks do motor de validação do ValidaGeo.
+
+Deve ser executado com o Python do QGIS (veja run-env-linux.sh), por exemplo:
+
+    python3 scripts/benchmark.py overlaps --features 400 --vertices 4000
+
+Cada subcomando gera uma camada sintética em memória, executa a implementação
+anterior e a atual e imprime os tempos medidos.
+"""
+import argparse
+import importlib
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from qgis.core import (QgsApplication, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY,
+                       QgsSpatialIndex, QgsFeatureRequest, QgsVectorLayerFeatureSource, QgsVectorFileWriter)
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+engine = importlib.import_module(os.path.basename(PLUGIN_DIR) + '.valida_geo_engine')
+correction = importlib.import_module(os.path.basename(PLUGIN_DIR) + '.valida_geo_correction')
+
+
+def timed(label, function, *args, **kwargs):
+    start = time.perf_counter(); result = function(*args, **kwargs); elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:10.3f} s")
+    return result, elapsed
+
+
+def circle_layer(features, vertices, spacing):
+    """Camada de polígonos circulares com ``vertices`` vértices, sobrepostos em grade."""
+    layer = QgsVectorLayer('Polygon?crs=EPSG:31983', 'benchmark', 'memory')
+    columns = max(int(math.sqrt(features)), 1); batch = []
+    for i in range(features):
+        center = QgsPointXY((i % columns) * spacing, (i // columns) * spacing)
+        feature = QgsFeature(); feature.setGeometry(QgsGeometry.fromPointXY(center).buffer(100, max(vertices // 4, 1)))
+        batch.append(feature)
+    layer.dataProvider().addFeatures(batch)
+    return layer
+
+
+def overlaps_unprepared(layer):
+    geometries = {f.id(): f.geometry() for f in layer.getFeatures(QgsFeatureRequest().setNoAttributes())}
+    index = QgsSpatialIndex(layer.getFeatures()); pairs = 0
+    for feature_id, geometry in geometries.items():
+        for candidate_id in index.intersects(geometry.boundingBox()):
+            if feature_id < candidate_id and geometry.intersects(geometries[candidate_id]): pairs += 1
+    return pairs
+
+
+def bench_overlaps(args):
+    layer = circle_layer(args.features, args.vertices, args.spacing)
+    print(f"overlaps: {args.features} feições, ~{args.vertices} vértices cada")
+    pairs, before = timed("intersects() sem preparação", overlaps_unprepared, layer)
+    store, after = timed("check_overlaps (geometria preparada)", engine.check_overlaps, layer)
+    print(f"pares: {pairs} / {store.count(engine.ERROR_OVERLAP)}  aceleração: {before / max(after, 1e-9):.1f}x")
+
+
+def duplicates_wkb_set(layer):
+    geometries_seen = set(); duplicates = 0
+    for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        geom_wkb = feature.geometry().asWkb()
+        if geom_wkb in geometries_seen: duplicates += 1
+        else: geometries_seen.add(geom_wkb)
+    return duplicates
+
+
+def peak_memory(label, function, *args):
+    tracemalloc.start()
+    try:
+        result, _ = timed(label, function, *args); peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    print(f"{'':<40} pico de memória Python: {peak / 2 ** 20:10.1f} MiB")
+    return result, peak
+
+
+def bench_duplicates(args):
+    layer = circle_layer(args.features, args.vertices, args.spacing)
+    if args.duplicates: layer.dataProvider().addFeatures(list(layer.getFeatures(QgsFeatureRequest().setLimit(args.duplicates))))
+    print(f"duplicates: {layer.featureCount()} feições, ~{args.vertices} vértices cada")
+    count, before = peak_memory("conjunto de WKB completos", duplicates_wkb_set, layer)
+    store, after = peak_memory("check_duplicates (resumo blake2b)", engine.check_duplicates, layer)
+    print(f"duplicatas: {count} / {len(store)}  redução de memória: {before / max(after, 1):.1f}x")
+
+
+def bowtie_layer(features, vertices, invalid_every):
+    """Círculos com ``vertices`` vértices; um a cada ``invalid_every`` tem dois vértices trocados (auto-interseção)."""
+    layer = circle_layer(features, vertices, 250.0); changes = {}
+    for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        if feature.id() % invalid_every: continue
+        points = feature.geometry().asPolygon()[0]; points[1], points[len(points) // 2] = points[len(points) // 2], points[1]
+        changes[feature.id()] = QgsGeometry.fromPolygonXY([points])
+    layer.dataProvider().changeGeometryValues(changes)
+    return layer
+
+
+def bench_validity(args):
+    layer = bowtie_layer(args.features, args.vertices, args.invalid_every)
+    print(f"validity: {args.features} feições, ~{args.vertices} vértices cada")
+    store, base = timed("check_geometry (1 thread)", engine.check_geometry, layer)
+    for workers in args.workers:
+        sources = [QgsVectorLayerFeatureSource(layer) for _ in range(workers)]
+        parallel, elapsed = timed(f"check_geometry_parallel ({workers} threads)", engine.check_geometry_parallel, sources)
+        print(f"  inválidas: {len(parallel)} / {len(store)}  aceleração: {base / max(elapsed, 1e-9):.1f}x")
+
+
+def bench_validity_cache(args):
+    layer = bowtie_layer(args.features, args.vertices, args.invalid_every)
+    print(f"validity-cache: {args.features} feições, ~{args.vertices} vértices cada")
+    store, base = timed("check_geometry (sem cache)", engine.check_geometry, layer)
+    with tempfile.TemporaryDirectory() as directory:
+        options = {'validity_cache': os.path.join(directory, 'validity.sqlite')}
+        timed("run_checks (cache vazio)", engine.run_checks, layer, [engine.ERROR_GEOMETRY], options=options)
+        changes = {fid: QgsGeometry.fromPointXY(QgsPointXY(fid * 1000.0, 0.0)).buffer(50, 8) for fid in range(1, args.features + 1, args.changed_every)}
+        layer.dataProvider().changeGeometryValues(changes)
+        cached, elapsed = timed(f"run_checks ({len(changes)} alteradas)", engine.run_checks, layer, [engine.ERROR_GEOMETRY], options=options)
+    hits, misses = cached.stats['validity_cache']
+    print(f"  acertos: {hits}  falhas: {misses}  aceleração: {base / max(elapsed, 1e-9):.1f}x")
+
+
+def bench_fused(args):
+    layer = bowtie_layer(args.features, args.vertices, args.invalid_every)
+    checks = [engine.ERROR_GEOMETRY, engine.ERROR_OVERLAP, engine.ERROR_DUPLICATE]
+    print(f"fused: {args.features} feições, ~{args.vertices} vértices cada")
+    separate, base = timed("run_checks (uma passada por verificação)", engine.run_checks, layer, checks, options={'fused_scan': False})
+    fused, elapsed = timed("run_checks (passada única)", engine.run_checks, layer, checks)
+    for label, store in (("separadas", separate), ("única", fused)):
+        seconds = ", ".join(f"{engine.ERROR_TAGS[c]} {store.stats[c][1]:.2f} s" for c in checks)
+        print(f"  {label}: leitura {store.stats['read']:.2f} s; {seconds}")
+    print(f"  erros: {len(fused)} / {len(separate)}  aceleração: {base / max(elapsed, 1e-9):.1f}x")
+
+
+def fix_one_by_one(layer, fids):
+    return sum(1 for fid in fids if not layer.getFeature(fid).geometry().makeValid().isNull())
+
+
+def fix_batched(layer, fids):
+    return sum(1 for _, geometry in correction.fixed_geometries(QgsVectorLayerFeatureSource(layer), fids, {}) if not geometry.isNull())
+
+
+def write_edit_buffer(layer, fixes):
+    layer.startEditing()
+    for fid, geometry in fixes.items(): layer.changeGeometry(fid, geometry)
+    return layer.commitChanges()
+
+
+def write_batches(layer, fixes, batch_size):
+    writer = correction.GeometryWriter(layer.dataProvider(), batch_size)
+    for fid, geometry in fixes.items(): writer.add(fid, geometry)
+    writer.flush()
+    return writer.written
+
+
+def bench_correction(args):
+    memory_layer = bowtie_layer(args.features, args.vertices, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'correction.gpkg')
+        QgsVectorFileWriter.writeAsVectorFormat(memory_layer, path, 'utf-8', memory_layer.crs(), 'GPKG')
+        layer = QgsVectorLayer(path, 'correction', 'ogr'); fids = sorted(layer.allFeatureIds())
+        print(f"correction: {len(fids)} feições inválidas em GeoPackage, ~{args.vertices} vértices cada")
+        count, before = timed("getFeature(fid) por feição", fix_one_by_one, layer, fids)
+        fixed, after = timed("fixed_geometries (uma requisição)", fix_batched, layer, fids)
+        print(f"  corrigidas: {fixed} / {count}  aceleração: {before / max(after, 1e-9):.1f}x")
+        for workers in args.workers:
+            sources = [QgsVectorLayerFeatureSource(layer) for _ in range(workers)]
+            _, elapsed = timed(f"fixed_geometries_parallel ({workers} threads)", lambda: sum(1 for _ in correction.fixed_geometries_parallel(sources, fids, {})))
+            print(f"  aceleração: {after / max(elapsed, 1e-9):.1f}x")
+        fixes = dict(correction.fixed_geometries(QgsVectorLayerFeatureSource(layer), fids, {}))
+        _, before = timed("changeGeometry + commitChanges", write_edit_buffer, layer, fixes)
+        _, after = timed(f"GeometryWriter (lotes de {args.batch_size})", write_batches, layer, fixes, args.batch_size)
+        print(f"  aceleração da gravação: {before / max(after, 1e-9):.1f}x")
+        del layer
+
+
+def union_bfs(pairs, geometries):
+    adj = {}
+    for u, v in pairs: adj.setdefault(u, []).append(v); adj.setdefault(v, []).append(u)
+    visited = set(); groups = []
+    for node in adj:
+        if node in visited: continue
+        group = []; q = [node]; visited.add(node)
+        while q:
+            current = q.pop(0); group.append(current)
+            for neighbor in adj[current]:
+                if neighbor not in visited: visited.add(neighbor); q.append(neighbor)
+        groups.append(group)
+    return [QgsGeometry.unaryUnion([geometries[fid] for fid in group]) for group in groups]
+
+
+def union_cascaded(pairs, geometries):
+    return [correction.cascaded_union([geometries[fid] for fid in group]) for group in correction.overlap_groups(pairs)]
+
+
+def bench_union(args):
+    geometries = {i: QgsGeometry.fromPointXY(QgsPointXY(i * 15.0, (i % 2) * 5.0)).buffer(10, max(args.vertices // 4, 1)) for i in range(args.features)}
+    pairs = [(i, i + 1) for i in range(args.features - 1)]
+    print(f"union: cadeia de {args.features} feições sobrepostas, ~{args.vertices} vértices cada")
+    _, before = timed("BFS com pop(0) + unaryUnion único", union_bfs, pairs, geometries)
+    _, after = timed("union-find + união em árvore", union_cascaded, pairs, geometries)
+    print(f"  aceleração: {before / max(after, 1e-9):.1f}x")
+    layer = QgsVectorLayer('Polygon?crs=EPSG:31983', 'union', 'memory'); features = []
+    for fid in sorted(geometries):
+        feature = QgsFeature(); feature.setGeometry(geometries[fid]); features.append(feature)
+    layer.dataProvider().addFeatures(features); pairs = [(i + 1, i + 2) for i in range(args.features - 1)]
+    for workers in args.workers:
+        sources = [QgsVectorLayerFeatureSource(layer) for _ in range(workers)]
+        _, elapsed = timed(f"cut_overlaps ({workers} threads)", lambda: sum(1 for _ in correction.cut_overlaps(sources, pairs)))
+        print(f"  em relação à união em árvore: {after / max(elapsed, 1e-9):.1f}x")
+
+
+def bench_tiles(args):
+    layer = circle_layer(args.features, args.vertices, args.spacing)
+    print(f"tiles: {args.features} feições, ~{args.vertices} vértices cada")
+    store, base = timed("check_overlaps (1 thread, sem blocos)", engine.check_overlaps, layer)
+    for workers in args.workers:
+        sources = [QgsVectorLayerFeatureSource(layer) for _ in range(workers)]
+        tiled, elapsed = timed(f"check_overlaps_tiled ({workers} threads)", engine.check_overlaps_tiled, sources, layer.extent())
+        print(f"  pares: {len(tiled)} / {len(store)}  aceleração: {base / max(elapsed, 1e-9):.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    overlaps = commands.add_parser('overlaps', help="sobreposição com geometrias preparadas")
+    overlaps.add_argument('--features', type=int, default=400)
+    overlaps.add_argument('--vertices', type=int, default=4000)
+    overlaps.add_argument('--spacing', type=float, default=150.0)
+    overlaps.set_defaults(run=bench_overlaps)
+    tiles = commands.add_parser('tiles', help="sobreposição em blocos com várias threads")
+    tiles.add_argument('--features', type=int, default=40000)
+    tiles.add_argument('--vertices', type=int, default=64)
+    tiles.add_argument('--spacing', type=float, default=150.0)
+    tiles.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    tiles.set_defaults(run=bench_tiles)
+    validity = commands.add_parser('validity', help="escalabilidade da verificação de validade")
+    validity.add_argument('--features', type=int, default=50000)
+    validity.add_argument('--vertices', type=int, default=1000)
+    validity.add_argument('--invalid-every', type=int, default=10)
+    validity.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    validity.set_defaults(run=bench_validity)
+    validity_cache = commands.add_parser('validity-cache', help="revalidação com o cache de validade")
+    validity_cache.add_argument('--features', type=int, default=50000)
+    validity_cache.add_argument('--vertices', type=int, default=1000)
+    validity_cache.add_argument('--invalid-every', type=int, default=10)
+    validity_cache.add_argument('--changed-every', type=int, default=1000)
+    validity_cache.set_defaults(run=bench_validity_cache)
+    fused = commands.add_parser('fused', help="todas as verificações em uma única passada")
+    fused.add_argument('--features', type=int, default=50000)
+    fused.add_argument('--vertices', type=int, default=64)
+    fused.add_argument('--invalid-every', type=int, default=10)
+    fused.set_defaults(run=bench_fused)
+    correction_parser = commands.add_parser('correction', help="leitura das geometrias a corrigir")
+    correction_parser.add_argument('--features', type=int, default=100000)
+    correction_parser.add_argument('--vertices', type=int, default=64)
+    correction_parser.add_argument('--batch-size', type=int, default=5000)
+    correction_parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8, 16])
+    correction_parser.set_defaults(run=bench_correction)
+    union = commands.add_parser('union', help="agrupamento e união das sobreposições")
+    union.add_argument('--features', type=int, default=20000)
+    union.add_argument('--vertices', type=int, default=64)
+    union.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    union.set_defaults(run=bench_union)
+    duplicates = commands.add_parser('duplicates', help="memória da detecção de duplicatas")
+    duplicates.add_argument('--features', type=int, default=100000)
+    duplicates.add_argument('--vertices', type=int, default=256)
+    duplicates.add_argument('--spacing', type=float, default=150.0)
+    duplicates.add_argument('--duplicates', type=int, default=1000)
+    duplicates.set_defaults(run=bench_duplicates)
+    args = parser.parse_args()
+    app = QgsApplication([], False); app.initQgis()
+    try:
+        args.run(args)
+    finally:
+        app.exitQgis()
+
+
+if __name__ == '__main__':
+    main()
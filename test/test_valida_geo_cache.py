@@ -0,0 +1,68 @@
+# coding=utf-8
+"""Validity cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'ryancarlospn2010@gmail.com'
+__date__ = '2025-08-22'
+__copyright__ = 'Copyright 2025, Ryan Carlos'
+
+import math
+import os
+import tempfile
+import unittest
+
+from ..valida_geo_cache import ValidityCache
+
+
+class ValidityCacheTest(unittest.TestCase):
+    """Test the persistent validity cache."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache', 'validity.sqlite')
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.directory.cleanup()
+
+    def test_results_persist_between_sessions(self):
+        """Verdicts stored in one session are found in the next one."""
+        with ValidityCache(self.path, '3.12') as cache:
+            cache.store({b'a': None, b'b': (1, 'Self-intersection', 5.0, 5.0), b'c': (0, '', math.nan, math.nan)})
+        with ValidityCache(self.path, '3.12') as cache:
+            found = cache.lookup([b'a', b'b', b'c', b'd'])
+            self.assertIsNone(found[b'a'])
+            self.assertEqual(found[b'b'], (1, 'Self-intersection', 5.0, 5.0))
+            self.assertTrue(math.isnan(found[b'c'][2]))
+            self.assertNotIn(b'd', found)
+            self.assertEqual((cache.hits, cache.misses), (3, 1))
+            self.assertEqual(cache.hit_rate(), 0.75)
+
+    def test_new_geos_version_discards_entries(self):
+        """Results computed by another GEOS version are not reused."""
+        with ValidityCache(self.path, '3.11') as cache:
+            cache.store({b'a': None})
+        with ValidityCache(self.path, '3.12') as cache:
+            self.assertEqual(len(cache), 0)
+
+    def test_eviction_keeps_most_recent(self):
+        """Entries beyond the size limit are evicted oldest first."""
+        cache = ValidityCache(self.path, max_entries=2)
+        cache.store({b'a': None}); cache.store({b'b': None}); cache.store({b'c': None})
+        cache.connection.execute("UPDATE validity SET last_used = last_used - 10 WHERE digest = ?", (b'a',))
+        self.assertEqual(cache.evict(), 1)
+        self.assertEqual(sorted(cache.lookup([b'a', b'b', b'c'])), [b'b', b'c'])
+        cache.close()
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ValidityCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
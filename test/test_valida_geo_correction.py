@@ -0,0 +1,149 @@
+# coding=utf-8
+"""Geometry correction test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'ryancarlospn2010@gmail.com'
+__date__ = '2025-08-22'
+__copyright__ = 'Copyright 2025, Ryan Carlos'
+
+import os
+import tempfile
+import unittest
+
+from qgis.core import QgsVectorLayer, QgsFeature, QgsGeometry, QgsVectorLayerFeatureSource
+
+from ..valida_geo_correction import (fix_geometry, fixed_geometries, fixed_geometries_parallel, GeometryWriter, output_layer,
+                                     copy_features, overlap_groups, cascaded_union, cut_overlaps, GroupAggregator, CUT_SMALLER,
+                                     CUT_HIGHER_FID, AGGREGATE_CONCAT, AGGREGATE_SUM, AGGREGATE_MODE, AGGREGATE_LARGEST)
+from ..valida_geo_engine import validity_error
+from ..valida_geo_errors import VALIDITY_SELF_INTERSECTION
+
+from .utilities import get_qgis_app, make_polygon_layer
+
+QGIS_APP = get_qgis_app()
+
+BOWTIE = 'Polygon((0 0, 10 10, 10 0, 0 10, 0 0))'
+
+
+class ValidaGeoCorrectionTest(unittest.TestCase):
+    """Test the geometry corrections."""
+
+    def test_fix_geometry_routes_by_code(self):
+        """A near-duplicate spike is fixed by merging nodes, a bowtie by makeValid."""
+        spike = QgsGeometry.fromWkt('Polygon((0 0, 10 0, 10 10, 5 10, 5.000000001 10, 0 10, 0 0))')
+        code = validity_error(spike)[0]
+        self.assertEqual(code, VALIDITY_SELF_INTERSECTION)
+        fixed = fix_geometry(spike, code)
+        self.assertTrue(fixed.isGeosValid())
+        self.assertEqual(fixed.constGet().nCoordinates(), 6)
+        bowtie = QgsGeometry.fromWkt(BOWTIE)
+        self.assertTrue(fix_geometry(bowtie, validity_error(bowtie)[0]).isGeosValid())
+
+    def test_fixed_geometries_reads_requested_fids(self):
+        """Only the requested features are read and fixed."""
+        square = 'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'
+        layer = make_polygon_layer([BOWTIE, square, BOWTIE])
+        fixed = dict(fixed_geometries(QgsVectorLayerFeatureSource(layer), [1, 3], {}))
+        self.assertEqual(sorted(fixed), [1, 3])
+        self.assertTrue(all(geometry.isGeosValid() for geometry in fixed.values()))
+
+    def test_parallel_fixes_match_serial(self):
+        """Chunks fixed by several threads cover every requested fid."""
+        square = 'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'
+        layer = make_polygon_layer([BOWTIE, square, BOWTIE, BOWTIE, square, BOWTIE])
+        sources = [QgsVectorLayerFeatureSource(layer) for _ in range(3)]
+        parallel = dict(fixed_geometries_parallel(sources, [1, 3, 4, 6], {}, chunk_size=1))
+        serial = dict(fixed_geometries(QgsVectorLayerFeatureSource(layer), [1, 3, 4, 6], {}))
+        self.assertEqual(sorted(parallel), [1, 3, 4, 6])
+        self.assertTrue(all(parallel[fid].equals(serial[fid]) for fid in serial))
+
+    def test_overlap_groups_follow_chains(self):
+        """Pairs sharing a fid end up in the same group."""
+        self.assertEqual(overlap_groups([(1, 2), (5, 6), (3, 4), (2, 3)]), [[1, 2, 3, 4], [5, 6]])
+
+    def test_cascaded_union_matches_unary_union(self):
+        """The tree reduction gives the same area as a single union."""
+        geometries = [QgsGeometry.fromWkt('Polygon(({0} 0, {1} 0, {1} 10, {0} 10, {0} 0))'.format(i * 5, i * 5 + 10)) for i in range(40)]
+        levels = []
+        union = cascaded_union(geometries, lambda level, total: levels.append((level, total)), fanout=4)
+        self.assertAlmostEqual(union.area(), QgsGeometry.unaryUnion(geometries).area())
+        self.assertEqual(levels, [(1, 3), (2, 3), (3, 3)])
+
+    def test_cut_overlaps_keeps_every_feature(self):
+        """The overlap is removed from the feature chosen by the rule only."""
+        layer = make_polygon_layer(['Polygon((0 0, 10 0, 10 10, 0 10, 0 0))', 'Polygon((8 0, 12 0, 12 10, 8 10, 8 0))',
+                                    'Polygon((11 0, 20 0, 20 10, 11 10, 11 0))'])
+        sources = [QgsVectorLayerFeatureSource(layer) for _ in range(2)]
+        pairs = [(1, 2), (2, 3)]
+        cut = dict(cut_overlaps(sources, pairs, CUT_SMALLER, chunk_size=1))
+        self.assertEqual(sorted(cut), [2])
+        self.assertAlmostEqual(cut[2].area(), 10.0)
+        cut = dict(cut_overlaps(sources, pairs, CUT_HIGHER_FID))
+        self.assertEqual(sorted(cut), [2, 3])
+        self.assertAlmostEqual(cut[3].area(), 80.0)
+
+    def test_group_aggregation_policies(self):
+        """Each field is combined by its own policy while features stream in."""
+        layer = QgsVectorLayer('Polygon?crs=EPSG:31983&field=nome:string&field=valor:integer&field=classe:string', 'teste', 'memory')
+        rows = [('a', 5, 'x', 'Polygon((0 0, 1 0, 1 1, 0 1, 0 0))'), ('b', 7, 'y', 'Polygon((0 0, 9 0, 9 9, 0 9, 0 0))'),
+                ('c', None, 'y', 'Polygon((0 0, 2 0, 2 2, 0 2, 0 0))')]
+        features = []
+        for name, value, category, wkt in rows:
+            feature = QgsFeature(layer.fields())
+            feature.setAttributes([name, value, category])
+            feature.setGeometry(QgsGeometry.fromWkt(wkt))
+            features.append(feature)
+        layer.dataProvider().addFeatures(features)
+        policies = {'nome': AGGREGATE_CONCAT, 'valor': AGGREGATE_SUM, 'classe': AGGREGATE_MODE}
+        aggregator = GroupAggregator(layer.fields(), policies)
+        for feature in reversed(list(layer.getFeatures())):
+            aggregator.add(feature, feature.geometry().area())
+        self.assertEqual(aggregator.attributes(), ['a, b, c', 12, 'y'])
+        largest = GroupAggregator(layer.fields(), {'nome': AGGREGATE_LARGEST})
+        for feature in layer.getFeatures():
+            largest.add(feature, feature.geometry().area())
+        self.assertEqual(largest.attributes()[:2], ['b', 5])
+        with self.assertRaises(ValueError):
+            GroupAggregator(layer.fields(), {'nome': AGGREGATE_SUM})
+
+    def test_geometry_writer_batches(self):
+        """Geometries are written to the provider in batches."""
+        layer = make_polygon_layer([BOWTIE, BOWTIE, BOWTIE])
+        writer = GeometryWriter(layer.dataProvider(), batch_size=2)
+        for fid, geometry in fixed_geometries(QgsVectorLayerFeatureSource(layer), [1, 2, 3], {}):
+            writer.add(fid, geometry)
+        self.assertEqual(writer.written, 2)
+        writer.flush()
+        self.assertEqual(writer.written, 3)
+        self.assertTrue(all(feature.geometry().isGeosValid() for feature in layer.getFeatures()))
+
+    def test_corrections_go_to_a_new_output(self):
+        """Fixes written to the GeoPackage copy leave the source layer untouched."""
+        layer = make_polygon_layer([BOWTIE, BOWTIE], names=['a', 'b'])
+        layer.dataProvider().deleteFeatures([1])
+        with tempfile.TemporaryDirectory() as directory:
+            output = output_layer(layer, 'saida', os.path.join(directory, 'saida.gpkg'))
+            self.assertTrue(output.isValid())
+            fid_map = copy_features(QgsVectorLayerFeatureSource(layer), output.dataProvider(), batch_size=1)
+            self.assertEqual(set(fid_map), {2})
+            writer = GeometryWriter(output.dataProvider())
+            for fid, geometry in fixed_geometries(QgsVectorLayerFeatureSource(layer), [2], {}):
+                writer.add(fid_map[fid], geometry)
+            writer.flush()
+            copied = output.getFeature(fid_map[2])
+            self.assertTrue(copied.geometry().isGeosValid())
+            self.assertEqual(copied['nome'], 'b')
+            self.assertFalse(layer.getFeature(2).geometry().isGeosValid())
+            del output
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ValidaGeoCorrectionTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
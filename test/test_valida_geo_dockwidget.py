@@ -16,9 +16,9 @@ import unittest
 
 from qgis.PyQt.QtGui import QDockWidget
 
-from valida_geo_dockwidget import ValidaGeoDockWidget
+from ..valida_geo_dockwidget import ValidaGeoDockWidget
 
-from utilities import get_qgis_app
+from .utilities import get_qgis_app
 
 QGIS_APP = get_qgis_app()
 
@@ -0,0 +1,242 @@
+# coding=utf-8
+"""Validation engine test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'ryancarlospn2010@gmail.com'
+__date__ = '2025-08-22'
+__copyright__ = 'Copyright 2025, Ryan Carlos'
+
+import os
+import tempfile
+import unittest
+
+from qgis.core import QgsVectorLayer, QgsVectorLayerFeatureSource, QgsVectorFileWriter, QgsFeatureRequest
+
+from ..valida_geo_engine import (check_geometry, check_geometry_parallel, check_overlaps, check_overlaps_tiled, check_duplicates,
+                                 check_near_duplicates, check_attribute_duplicates, run_checks, layer_snapshot, sql_target, attribute_key,
+                                 error_locations_layer, ExternalDigestSorter, OVERLAP_INTERSECTS, OVERLAP_INTERIOR, PATH_SQL, PATH_PYTHON)
+from ..valida_geo_errors import ERROR_GEOMETRY, ERROR_OVERLAP, ERROR_DUPLICATE, VALIDITY_SELF_INTERSECTION
+
+from .utilities import get_qgis_app, make_polygon_layer
+
+QGIS_APP = get_qgis_app()
+
+
+class ValidaGeoEngineTest(unittest.TestCase):
+    """Test the GUI-free validation engine."""
+
+    def test_invalid_geometry_is_reported(self):
+        """Only the self-intersecting polygon is reported as invalid."""
+        layer = make_polygon_layer([
+            'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))',
+            'Polygon((0 0, 10 10, 10 0, 0 10, 0 0))'])
+        store = check_geometry(layer)
+        self.assertEqual(store.fids_of_type(ERROR_GEOMETRY), [2])
+
+    def test_invalid_geometry_reason_and_location(self):
+        """The GEOS reason, its class and the offending point are stored."""
+        layer = make_polygon_layer(['Polygon((0 0, 10 10, 10 0, 0 10, 0 0))'])
+        store = check_geometry(layer)
+        self.assertEqual(store.value('codes', 0), VALIDITY_SELF_INTERSECTION)
+        self.assertIn('Self-intersection', store.description(0))
+        self.assertEqual((store.value('xs', 0), store.value('ys', 0)), (5.0, 5.0))
+        self.assertEqual(error_locations_layer(store, layer.crs()).featureCount(), 1)
+
+    def test_validity_cache_skips_known_geometries(self):
+        """A second run answers every geometry from the cache."""
+        bowtie = 'Polygon((0 0, 10 10, 10 0, 0 10, 0 0))'
+        layer = make_polygon_layer([bowtie, 'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))', bowtie])
+        with tempfile.TemporaryDirectory() as directory:
+            options = {'validity_cache': os.path.join(directory, 'validity.sqlite')}
+            first = run_checks(layer, [ERROR_GEOMETRY], options=options)
+            second = run_checks(layer, [ERROR_GEOMETRY], options=options)
+        self.assertEqual(first.stats['validity_cache'], (0, 2))
+        self.assertEqual(second.stats['validity_cache'], (2, 0))
+        self.assertEqual(list(second.fids), [1, 3])
+        self.assertEqual(second.description(0), first.description(0))
+
+    def test_parallel_validity_keeps_fid_order(self):
+        """Chunks processed by several threads are merged in fid order."""
+        bowtie = 'Polygon((0 0, 10 10, 10 0, 0 10, 0 0))'
+        square = 'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'
+        layer = make_polygon_layer([bowtie, square, bowtie, square, bowtie, bowtie, square])
+        sources = [QgsVectorLayerFeatureSource(layer) for _ in range(3)]
+        store = check_geometry_parallel(sources, chunk_size=2)
+        self.assertEqual(list(store.fids), [1, 3, 5, 6])
+
+    def test_overlapping_pair_is_reported_once(self):
+        """Two overlapping squares produce a single overlap record."""
+        layer = make_polygon_layer([
+            'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))',
+            'Polygon((5 5, 15 5, 15 15, 5 15, 5 5))',
+            'Polygon((100 100, 110 100, 110 110, 100 110, 100 100))'])
+        store = check_overlaps(layer)
+        self.assertEqual(store.overlap_pairs(), [(1, 2)])
+
+    def test_overlaps_with_tiny_geometry_cache(self):
+        """Evicted candidates are fetched again from the source."""
+        layer = make_polygon_layer([
+            'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))',
+            'Polygon((50 50, 60 50, 60 60, 50 60, 50 50))',
+            'Polygon((5 5, 15 5, 15 15, 5 15, 5 5))'])
+        store = check_overlaps(layer, cache_size=1)
+        self.assertEqual(store.overlap_pairs(), [(1, 3)])
+
+    def test_tiled_overlaps_match_streaming(self):
+        """Pairs straddling tile borders are reported exactly once."""
+        layer = make_polygon_layer([
+            'Polygon((0 0, 60 0, 60 60, 0 60, 0 0))',
+            'Polygon((40 40, 100 40, 100 100, 40 100, 40 40))',
+            'Polygon((45 0, 55 0, 55 100, 45 100, 45 0))',
+            'Polygon((90 0, 100 0, 100 10, 90 10, 90 0))'])
+        sources = [QgsVectorLayerFeatureSource(layer) for _ in range(3)]
+        tiled = check_overlaps_tiled(sources, layer.extent(), tiles_per_side=4)
+        self.assertEqual(sorted(tiled.overlap_pairs()), sorted(check_overlaps(layer).overlap_pairs()))
+        self.assertEqual(len(tiled), 3)
+
+    def test_touching_neighbours_are_not_overlaps(self):
+        """Sharing a boundary only counts as overlap in intersects mode."""
+        layer = make_polygon_layer([
+            'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))',
+            'Polygon((10 0, 20 0, 20 10, 10 10, 10 0))'])
+        self.assertEqual(len(check_overlaps(layer)), 0)
+        self.assertEqual(check_overlaps(layer, mode=OVERLAP_INTERSECTS).overlap_pairs(), [(1, 2)])
+
+    def test_overlap_minimum_area(self):
+        """Overlaps smaller than the tolerance are ignored."""
+        layer = make_polygon_layer([
+            'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))',
+            'Polygon((9.9 0, 20 0, 20 10, 9.9 10, 9.9 0))'])
+        self.assertEqual(len(check_overlaps(layer, mode=OVERLAP_INTERIOR, min_area=2.0)), 0)
+        store = check_overlaps(layer, mode=OVERLAP_INTERIOR, min_area=0.5)
+        self.assertAlmostEqual(store.value('areas', 0), 1.0)
+
+    def test_duplicate_geometry_reports_later_feature(self):
+        """Only the second copy of an identical geometry is a duplicate."""
+        square = 'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'
+        layer = make_polygon_layer([square, square])
+        store = check_duplicates(layer)
+        self.assertEqual(store.fids_of_type(ERROR_DUPLICATE), [2])
+        self.assertEqual(len(store), 1)
+
+    def test_external_duplicates_match_in_memory(self):
+        """Spilling digests to disk finds the same duplicates."""
+        square = 'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'
+        other = 'Polygon((20 0, 30 0, 30 10, 20 10, 20 0))'
+        layer = make_polygon_layer([square, other, square, other, square])
+        store = check_duplicates(layer, memory_budget=200)
+        self.assertEqual(sorted(zip(store.fids, store.partners)), [(3, 1), (4, 2), (5, 1)])
+
+    def test_external_sort_merges_in_passes(self):
+        """More runs than the fan-in are merged in several passes."""
+        class SmallFanIn(ExternalDigestSorter):
+            MERGE_FAN_IN = 2
+        with SmallFanIn(memory_budget=1) as sorter:
+            for fid in range(1, 8): sorter.add(bytes([fid % 3]) * 16, fid)
+            self.assertEqual(len(sorter.runs), 7)
+            self.assertEqual(sorted(sorter.duplicate_pairs()), [(4, 1), (5, 2), (6, 3), (7, 1)])
+            self.assertEqual(len(sorter.runs), 2)
+
+    def test_attribute_key_reads_only_key_columns(self):
+        """The key request keeps the attribute subset and skips the geometry."""
+        layer = make_polygon_layer(['Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'])
+        indices, request, _ = attribute_key(layer, ['nome'])
+        self.assertEqual(request.subsetOfAttributes(), indices)
+        self.assertTrue(request.flags() & QgsFeatureRequest.SubsetOfAttributes)
+        self.assertTrue(request.flags() & QgsFeatureRequest.NoGeometry)
+        _, request, _ = attribute_key(layer, ['nome'], include_geometry=True)
+        self.assertFalse(request.flags() & QgsFeatureRequest.NoGeometry)
+
+    def test_canonical_duplicates(self):
+        """Reordered, reversed or single-part multi copies are canonical duplicates."""
+        layer = make_polygon_layer([
+            'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))',
+            'Polygon((10 10, 10 0, 0 0, 0 10, 10 10))',
+            'MultiPolygon(((0 10, 0 0, 10 0, 10 10, 0 10)))'])
+        self.assertEqual(len(check_duplicates(layer)), 0)
+        self.assertEqual(check_duplicates(layer, canonical=True).fids_of_type(ERROR_DUPLICATE), [2, 3])
+
+    def test_near_duplicates_within_tolerance(self):
+        """Slightly shifted copies are near duplicates of the first feature."""
+        layer = make_polygon_layer([
+            'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))',
+            'Polygon((0.05 0, 10.05 0, 10.05 10, 0.05 10, 0.05 0))',
+            'Polygon((3 0, 13 0, 13 10, 3 10, 3 0))'])
+        store = check_near_duplicates(layer, tolerance=0.1)
+        self.assertEqual(list(store.fids), [2])
+        self.assertEqual(list(store.partners), [1])
+
+    def test_attribute_key_duplicates(self):
+        """Records sharing the key fields are duplicates, with or without geometry."""
+        layer = make_polygon_layer([
+            'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))',
+            'Polygon((20 0, 30 0, 30 10, 20 10, 20 0))',
+            'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'], names=['a', 'a', 'a'])
+        self.assertEqual(list(check_attribute_duplicates(layer, ['nome']).fids), [2, 3])
+        store = check_attribute_duplicates(layer, ['nome'], include_geometry=True)
+        self.assertEqual(list(store.fids), [3])
+
+    def test_run_checks_fills_one_store(self):
+        """run_checks fills a single store with every selected check."""
+        square = 'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'
+        layer = make_polygon_layer([square, square])
+        store = run_checks(layer, [ERROR_DUPLICATE, ERROR_OVERLAP])
+        self.assertEqual(store.count(ERROR_OVERLAP), 1)
+        self.assertEqual(store.count(ERROR_DUPLICATE), 1)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.stats[ERROR_DUPLICATE][0], PATH_PYTHON)
+
+    def test_run_checks_with_feature_source(self):
+        """run_checks reads from a feature source as the background task does."""
+        square = 'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'
+        layer = make_polygon_layer([square, 'Polygon((0 0, 10 10, 10 0, 0 10, 0 0))', square])
+        checks = [ERROR_GEOMETRY, ERROR_OVERLAP, ERROR_DUPLICATE]
+        expected = run_checks(layer, checks)
+        snapshot = layer_snapshot(layer)
+        self.assertEqual(snapshot.feature_count, 3)
+        store = run_checks(layer, checks, QgsVectorLayerFeatureSource(layer), snapshot=snapshot)
+        self.assertEqual(list(zip(store.fids, store.types, store.partners)), list(zip(expected.fids, expected.types, expected.partners)))
+
+    def test_fused_scan_matches_separate_scans(self):
+        """One shared pass finds the same errors as one pass per check."""
+        square = 'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'
+        layer = make_polygon_layer([square, 'Polygon((0 0, 10 10, 10 0, 0 10, 0 0))', 'Polygon((5 5, 15 5, 15 15, 5 15, 5 5))', square],
+                                   names=['a', 'b', 'a', 'c'])
+        checks = [ERROR_GEOMETRY, ERROR_OVERLAP, ERROR_DUPLICATE]
+        for options in ({}, {'duplicate_key_fields': ['nome']}):
+            fused = run_checks(layer, checks, options=options)
+            separate = run_checks(layer, checks, options=dict(options, fused_scan=False))
+            self.assertEqual(list(zip(fused.fids, fused.types, fused.partners)), list(zip(separate.fids, separate.types, separate.partners)))
+            self.assertIn('read', fused.stats)
+            self.assertEqual(sorted(check for check in fused.stats if check in checks), checks)
+
+    def test_duplicates_pushed_down_to_geopackage(self):
+        """GeoPackage layers answer the duplicate check with SQL."""
+        square = 'Polygon((0 0, 10 0, 10 10, 0 10, 0 0))'
+        memory_layer = make_polygon_layer([square, 'Polygon((20 0, 30 0, 30 10, 20 10, 20 0))', square])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'teste.gpkg')
+            QgsVectorFileWriter.writeAsVectorFormat(memory_layer, path, 'utf-8', memory_layer.crs(), 'GPKG')
+            layer = QgsVectorLayer(path, 'teste', 'ogr')
+            self.assertEqual(sql_target(layer).table, 'teste')
+            store = run_checks(layer, [ERROR_DUPLICATE])
+            self.assertEqual(store.stats[ERROR_DUPLICATE][0], PATH_SQL)
+            self.assertEqual(list(zip(store.fids, store.partners)), [(3, 1)])
+            python_store = run_checks(layer, [ERROR_DUPLICATE], options={'sql_pushdown': False})
+            self.assertEqual(list(python_store.fids), [3])
+            layer.startEditing(); layer.deleteFeature(3)
+            self.assertIsNone(sql_target(layer))
+            self.assertEqual(len(run_checks(layer, [ERROR_DUPLICATE])), 0)
+            layer.rollBack()
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ValidaGeoEngineTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,77 @@
+# coding=utf-8
+"""Error store test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'ryancarlospn2010@gmail.com'
+__date__ = '2025-08-22'
+__copyright__ = 'Copyright 2025, Ryan Carlos'
+
+import math
+import unittest
+
+from ..valida_geo_errors import (ErrorStore, ERROR_GEOMETRY, ERROR_OVERLAP, ERROR_DUPLICATE,
+                                 NO_PARTNER, VALIDITY_OTHER, VALIDITY_SELF_INTERSECTION, VALIDITY_TOO_FEW_POINTS,
+                                 classify_validity_message)
+
+
+class ErrorStoreTest(unittest.TestCase):
+    """Test the columnar error store."""
+
+    def test_columns_and_queries(self):
+        """Errors are kept per column and can be queried by type."""
+        store = ErrorStore()
+        store.append(3, ERROR_GEOMETRY)
+        store.append(4, ERROR_OVERLAP, 7)
+        store.append(9, ERROR_DUPLICATE)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(list(store.partners), [NO_PARTNER, 7, NO_PARTNER])
+        self.assertEqual(store.fids_of_type(ERROR_GEOMETRY), [3])
+        self.assertEqual(store.overlap_pairs(), [(4, 7)])
+        self.assertEqual(store.description(1), 'Sobrepõe a feição ID 7')
+
+    def test_optional_columns_are_lazy(self):
+        """Location columns are only allocated once a value is stored."""
+        store = ErrorStore()
+        store.append(1, ERROR_GEOMETRY)
+        self.assertIsNone(store.xs)
+        store.append(2, ERROR_GEOMETRY, x=10.0, y=20.0)
+        self.assertEqual(len(store.xs), 2)
+        self.assertTrue(math.isnan(store.value('xs', 0)))
+        self.assertEqual(store.value('ys', 1), 20.0)
+        self.assertTrue(math.isnan(store.value('areas', 1)))
+
+    def test_extend_aligns_optional_columns(self):
+        """Merging stores keeps every column the same length."""
+        first = ErrorStore()
+        first.append(1, ERROR_DUPLICATE)
+        second = ErrorStore()
+        second.append(2, ERROR_OVERLAP, 5, area=3.5)
+        first.extend(second)
+        self.assertEqual(list(first.fids), [1, 2])
+        self.assertEqual(len(first.areas), 2)
+        self.assertEqual(first.value('areas', 1), 3.5)
+
+    def test_validity_messages(self):
+        """GEOS messages are classified and shown in the description."""
+        self.assertEqual(classify_validity_message('Ring Self-intersection'), VALIDITY_SELF_INTERSECTION)
+        self.assertEqual(classify_validity_message('Too few points in geometry component'), VALIDITY_TOO_FEW_POINTS)
+        self.assertEqual(classify_validity_message('Something else'), VALIDITY_OTHER)
+        store = ErrorStore()
+        store.append(1, ERROR_DUPLICATE)
+        store.append(2, ERROR_GEOMETRY, x=1.0, y=2.0, code=VALIDITY_SELF_INTERSECTION, message='Self-intersection')
+        self.assertEqual(store.geometry_codes(), {2: VALIDITY_SELF_INTERSECTION})
+        self.assertEqual(store.description(1), 'Geometria inválida: Self-intersection')
+        self.assertTrue(store.has_location(1))
+        self.assertFalse(store.has_location(0))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ErrorStoreTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
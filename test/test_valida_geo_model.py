@@ -0,0 +1,67 @@
+# coding=utf-8
+"""Error table model test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'ryancarlospn2010@gmail.com'
+__date__ = '2025-08-22'
+__copyright__ = 'Copyright 2025, Ryan Carlos'
+
+import unittest
+
+from qgis.PyQt.QtCore import Qt
+
+from ..valida_geo_errors import ErrorStore, ERROR_GEOMETRY, ERROR_OVERLAP
+from ..valida_geo_model import ErrorTableModel
+
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class ErrorTableModelTest(unittest.TestCase):
+    """Test the virtualized errors model."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.store = ErrorStore()
+        self.store.append(8, ERROR_GEOMETRY)
+        self.store.append(2, ERROR_OVERLAP, 5)
+        self.store.append(4, ERROR_GEOMETRY)
+        self.model = ErrorTableModel()
+        self.model.set_store(self.store)
+
+    def test_cells_come_from_store(self):
+        """Cells are rendered from the store columns."""
+        self.assertEqual(self.model.rowCount(), 3)
+        self.assertEqual(self.model.data(self.model.index(1, 0)), '2')
+        self.assertEqual(self.model.data(self.model.index(1, 2)), 'Sobrepõe a feição ID 5')
+
+    def test_sort_and_filter(self):
+        """Sorting and filtering only reorder store rows."""
+        self.model.sort(0, Qt.DescendingOrder)
+        self.assertEqual([self.model.fid(r) for r in range(3)], [8, 4, 2])
+        self.model.set_type_filter(ERROR_GEOMETRY)
+        self.assertEqual([self.model.fid(r) for r in range(self.model.rowCount())], [8, 4])
+        self.assertEqual(len(self.store), 3)
+
+    def test_sort_by_description_text(self):
+        """The description column sorts by the displayed GEOS reason."""
+        store = ErrorStore()
+        store.append(1, ERROR_GEOMETRY, message='Too few points in geometry component')
+        store.append(2, ERROR_GEOMETRY, message='Self-intersection')
+        store.append(3, ERROR_GEOMETRY, message='Ring Self-intersection')
+        self.model.set_store(store)
+        self.model.sort(2)
+        self.assertEqual([self.model.fid(r) for r in range(3)], [3, 2, 1])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ErrorTableModelTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -59,3 +59,25 @@ def get_qgis_app():
         IFACE = QgisInterface(CANVAS)
 
     return QGIS_APP, CANVAS, IFACE, PARENT
+
+
+def make_polygon_layer(wkts, names=None):
+    """Create a memory polygon layer with one feature per WKT.
+
+    :param wkts: Geometry of each feature, as WKT.
+    :param names: Optional value of the ``nome`` field of each feature,
+        defaulting to ``f0``, ``f1``...
+    :returns: The memory layer, with fids starting at 1.
+    :rtype: QgsVectorLayer
+    """
+    from qgis.core import QgsVectorLayer, QgsFeature, QgsGeometry
+
+    layer = QgsVectorLayer('Polygon?crs=EPSG:31983&field=nome:string', 'teste', 'memory')
+    features = []
+    for i, wkt in enumerate(wkts):
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(QgsGeometry.fromWkt(wkt))
+        feature.setAttributes([names[i] if names else 'f{}'.format(i)])
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Cache persistente dos resultados de validade, indexado pelo resumo da geometria.
+
+Um arquivo SQLite guarda, para cada resumo blake2b do WKB, se a geometria é
+válida e, caso não seja, o código, a mensagem e o local do erro. Em validações
+repetidas da mesma camada, apenas as geometrias novas ou alteradas passam pela
+GEOS. O cache é descartado quando a versão da GEOS muda.
+"""
+import os
+import sqlite3
+import threading
+import time
+from math import isnan, nan
+
+DEFAULT_MAX_ENTRIES = 5000000
+DEFAULT_MAX_AGE_DAYS = 90
+LOOKUP_BATCH_SIZE = 500  # abaixo do limite de parâmetros por consulta do SQLite
+
+SCHEMA = ("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+          "CREATE TABLE IF NOT EXISTS validity (digest BLOB PRIMARY KEY, valid INTEGER NOT NULL, code INTEGER, "
+          "message TEXT, x REAL, y REAL, last_used INTEGER NOT NULL)",
+          "CREATE INDEX IF NOT EXISTS validity_last_used ON validity (last_used)")
+
+
+class ValidityCache:
+    """Mapeia resumo -> ``None`` (válida) ou ``(código, mensagem, x, y)``.
+
+    Pode ser compartilhado entre as threads de verificação: o acesso à conexão
+    é serializado por uma trava.
+    """
+
+    def __init__(self, path, version="", max_entries=DEFAULT_MAX_ENTRIES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self.path = path; self.max_entries = max_entries; self.max_age_days = max_age_days
+        self.hits = 0; self.misses = 0; self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            for statement in SCHEMA: self.connection.execute(statement)
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None or row[0] != version:
+                self.connection.execute("DELETE FROM validity")
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM validity").fetchone()[0]
+
+    def lookup(self, digests):
+        """Devolve ``{resumo: resultado}`` apenas para os resumos já conhecidos."""
+        found = {}; now = int(time.time())
+        with self._lock, self.connection:
+            for start in range(0, len(digests), LOOKUP_BATCH_SIZE):
+                batch = digests[start:start + LOOKUP_BATCH_SIZE]
+                rows = self.connection.execute(f"SELECT digest, valid, code, message, x, y FROM validity WHERE digest IN ({','.join('?' * len(batch))})", batch)
+                for digest, valid, code, message, x, y in rows:
+                    found[digest] = None if valid else (code, message or "", nan if x is None else x, nan if y is None else y)
+            self.connection.executemany("UPDATE validity SET last_used = ? WHERE digest = ?", ((now, digest) for digest in found))
+            unique = len(set(digests)); self.hits += len(found); self.misses += unique - len(found)
+        return found
+
+    def store(self, results):
+        """Grava ``{resumo: resultado}`` calculados pela GEOS."""
+        now = int(time.time())
+        rows = [(digest, 1, None, None, None, None, now) if result is None else
+                (digest, 0, result[0], result[1], None if isnan(result[2]) else result[2], None if isnan(result[3]) else result[3], now)
+                for digest, result in results.items()]
+        with self._lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO validity VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def evict(self):
+        """Remove entradas não usadas há mais de ``max_age_days`` e as mais antigas além de ``max_entries``."""
+        with self._lock, self.connection:
+            removed = 0
+            if self.max_age_days > 0:
+                removed += self.connection.execute("DELETE FROM validity WHERE last_used < ?", (int(time.time()) - self.max_age_days * 86400,)).rowcount
+            excess = self.connection.execute("SELECT COUNT(*) FROM validity").fetchone()[0] - self.max_entries
+            if self.max_entries > 0 and excess > 0:
+                removed += self.connection.execute("DELETE FROM validity WHERE digest IN (SELECT digest FROM validity ORDER BY last_used LIMIT ?)", (excess,)).rowcount
+        return removed
+
+    def hit_rate(self):
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def summary(self):
+        return f"cache de validade: {self.hits} acertos, {self.misses} falhas ({self.hit_rate():.1%})"
+
+    def close(self):
+        if self.connection is None: return
+        self.evict(); self.connection.close(); self.connection = None
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""Correções aplicadas pela ``CorrectionTask``.
+
+As correções de geometria são escolhidas pelo tipo de problema de validade
+relatado pela GEOS: auto-interseções causadas por vértices quase coincidentes
+recebem um reparo barato e local; os demais problemas, ou quando o reparo não
+basta, seguem para ``makeValid()``, que reconstrói a geometria inteira. As
+sobreposições são resolvidas dissolvendo cada grupo ou recortando a área
+sobreposta de uma das feições de cada par.
+"""
+from collections import Counter
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (NULL, QgsFeature, QgsFeatureRequest, QgsGeometry, QgsRectangle, QgsVectorFileWriter, QgsVectorLayer,
+                       QgsCoordinateTransformContext, QgsProcessingUtils, QgsWkbTypes)
+
+from .valida_geo_engine import parallel_imap
+from .valida_geo_errors import VALIDITY_SELF_INTERSECTION, VALIDITY_OTHER
+
+WRITE_BATCH_SIZE = 5000
+FIX_CHUNK_SIZE = 500
+OUTPUT_TABLE = 'corrigida'
+NODE_TOLERANCE = 1e-8  # vértices consecutivos mais próximos que isso são fundidos antes do makeValid()
+UNION_FANOUT = 16  # geometrias unidas por nó da árvore de redução
+
+OVERLAP_DISSOLVE = 'dissolve'
+OVERLAP_CUT = 'cut'
+# regra do recorte: qual feição de cada par perde a área sobreposta
+CUT_SMALLER = 'smaller'
+CUT_LARGER = 'larger'
+CUT_HIGHER_FID = 'higher_fid'
+CUT_PRIORITY = 'priority'  # menor valor do campo de prioridade mantém a área
+
+# políticas de agregação dos atributos de um grupo dissolvido
+AGGREGATE_FIRST = 'first'  # feição de menor fid
+AGGREGATE_SUM = 'sum'
+AGGREGATE_MIN = 'min'
+AGGREGATE_MAX = 'max'
+AGGREGATE_CONCAT = 'concat'
+AGGREGATE_MODE = 'mode'
+AGGREGATE_LARGEST = 'largest_area'
+AGGREGATE_LABELS = {AGGREGATE_FIRST: "Primeira (menor ID)", AGGREGATE_SUM: "Soma", AGGREGATE_MIN: "Mínimo", AGGREGATE_MAX: "Máximo",
+                    AGGREGATE_CONCAT: "Concatenar", AGGREGATE_MODE: "Mais frequente", AGGREGATE_LARGEST: "Da maior área"}
+CONCAT_SEPARATOR = ', '
+
+CORRECTION_OPTIONS = {'write_batch_size': WRITE_BATCH_SIZE, 'workers': 1, 'overlap_resolution': OVERLAP_DISSOLVE,
+                      'cut_rule': CUT_SMALLER, 'priority_field': None, 'aggregation': {}}
+
+
+def fix_geometry(geometry, code):
+    """Devolve uma cópia válida de ``geometry`` para o problema ``code``.
+
+    A GEOS não acusa pontos repetidos, mas vértices quase coincidentes formam
+    espinhos que ela relata como auto-interseção; nesse caso, fundir os vértices
+    a menos de ``NODE_TOLERANCE`` costuma bastar e preserva o restante da geometria.
+    """
+    if code == VALIDITY_SELF_INTERSECTION:
+        fixed = QgsGeometry(geometry); fixed.removeDuplicateNodes(NODE_TOLERANCE)
+        if fixed.isGeosValid(): return fixed
+    return geometry.makeValid()
+
+
+def fixed_geometries(source, fids, codes):
+    """Lê as geometrias de ``fids`` em uma única requisição, sem atributos, e gera ``(fid, geometria corrigida)``.
+
+    ``codes`` mapeia fid -> código do problema de validade (``ErrorStore.geometry_codes``).
+    """
+    for feature in source.getFeatures(QgsFeatureRequest().setFilterFids(list(fids)).setNoAttributes()):
+        yield feature.id(), fix_geometry(feature.geometry(), codes.get(feature.id(), VALIDITY_OTHER))
+
+
+
+def fixed_geometries_parallel(sources, fids, codes, feedback=None, chunk_size=FIX_CHUNK_SIZE):
+    """Como ``fixed_geometries``, com as correções calculadas em um pool de threads.
+
+    Os fids são divididos em blocos de ``chunk_size``; cada thread lê e corrige um
+    bloco a partir da sua própria fonte em ``sources`` e os blocos prontos são
+    gerados para um único consumidor (o ``GeometryWriter``), na ordem de conclusão.
+    """
+    fids = sorted(fids); chunks = [fids[start:start + chunk_size] for start in range(0, len(fids), chunk_size)]
+    for _, fixed in parallel_imap(sources, chunks, lambda source, chunk: list(fixed_geometries(source, chunk, codes)), feedback):
+        yield from fixed or ()
+
+
+def output_layer(layer, name, path=None):
+    """Cria um GeoPackage vazio com os campos, o tipo de geometria e o SRC de ``layer`` e devolve a camada aberta.
+
+    As correções são gravadas nele, e não em um ``clone()`` da camada, que
+    compartilharia a fonte de dados e alteraria o arquivo original, nem em uma
+    camada em memória, que manteria a camada inteira na RAM. Sem ``path``, o
+    arquivo vai para a pasta temporária do processamento, apagada ao fechar o QGIS.
+    O tipo de geometria é promovido a multi, como o ``makeValid()`` e a
+    dissolução podem devolver.
+    """
+    path = path or QgsProcessingUtils.generateTempFilename(f'{OUTPUT_TABLE}.gpkg')
+    options = QgsVectorFileWriter.SaveVectorOptions(); options.driverName = 'GPKG'; options.layerName = OUTPUT_TABLE
+    writer = QgsVectorFileWriter.create(path, layer.fields(), QgsWkbTypes.multiType(layer.wkbType()), layer.crs(), QgsCoordinateTransformContext(), options)
+    if writer.hasError() != QgsVectorFileWriter.NoError: raise RuntimeError(f"Falha ao criar a camada corrigida em '{path}': {writer.errorMessage()}")
+    del writer  # fecha o arquivo antes de abri-lo como camada
+    return QgsVectorLayer(f'{path}|layername={OUTPUT_TABLE}', name, 'ogr')
+
+
+def copy_features(source, provider, batch_size=WRITE_BATCH_SIZE, feedback=None):
+    """Copia as feições de ``source`` para ``provider`` em lotes e devolve ``{fid original: fid na cópia}``.
+
+    O provedor de destino numera as feições por conta própria; o mapa traduz os
+    fids do ``ErrorStore`` para os da cópia. Os atributos são associados pelo
+    nome do campo, pois o GeoPackage acrescenta a coluna ``fid`` aos campos.
+    """
+    fid_map = {}; batch = []; batch_size = max(batch_size, 1); fields = provider.fields()
+    positions = [(source_index, fields.lookupField(field.name())) for source_index, field in enumerate(source.fields())]
+    positions = [(source_index, index) for source_index, index in positions if index >= 0]
+
+    def copy(feature):
+        attributes = feature.attributes(); values = [NULL] * fields.count()
+        for source_index, index in positions: values[index] = attributes[source_index]
+        copied = QgsFeature(fields); copied.setGeometry(feature.geometry()); copied.setAttributes(values)
+        return copied
+
+    def write():
+        originals = [feature.id() for feature in batch]; ok, added = provider.addFeatures(batch)
+        if not ok: raise RuntimeError(f"Falha ao copiar {len(batch)} feições para a camada corrigida: {'; '.join(provider.errors()[-1:])}")
+        fid_map.update(zip(originals, (feature.id() for feature in added)))
+
+    for feature in source.getFeatures():
+        if feedback is not None and feedback.isCanceled(): break
+        batch.append(copy(feature))
+        if len(batch) >= batch_size: write(); batch = []
+    if batch: write()
+    return fid_map
+
+
+class GeometryWriter:
+    """Grava geometrias corrigidas em lotes com ``changeGeometryValues`` do provedor.
+
+    As alterações não passam pelo buffer de edição nem pela pilha de desfazer da
+    camada; cada lote de ``batch_size`` geometrias é uma única chamada ao provedor.
+    Um lote recusado pelo provedor interrompe a gravação com ``RuntimeError``.
+    """
+
+    def __init__(self, provider, batch_size=WRITE_BATCH_SIZE):
+        self.provider = provider; self.batch_size = max(batch_size, 1); self.batch = {}; self.written = 0
+
+    def add(self, fid, geometry):
+        self.batch[fid] = geometry
+        if len(self.batch) >= self.batch_size: self.flush()
+
+    def flush(self):
+        if not self.batch: return
+        if not self.provider.changeGeometryValues(self.batch):
+            raise RuntimeError(f"Falha ao gravar {len(self.batch)} geometrias corrigidas: {'; '.join(self.provider.errors()[-1:])}")
+        self.written += len(self.batch); self.batch = {}
+
+
+class DisjointSet:
+    """Conjuntos disjuntos (union-find) com compressão de caminho e união por posto."""
+
+    def __init__(self):
+        self.parent = {}; self.rank = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        if parent == item: return item
+        root = parent
+        while self.parent[root] != root: root = self.parent[root]
+        while self.parent[item] != root: self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, first, second):
+        first = self.find(first); second = self.find(second)
+        if first == second: return
+        first_rank = self.rank.get(first, 0); second_rank = self.rank.get(second, 0)
+        if first_rank < second_rank: first, second = second, first
+        self.parent[second] = first
+        if first_rank == second_rank: self.rank[first] = first_rank + 1
+
+    def groups(self):
+        """Grupos com mais de um elemento, cada um ordenado, na ordem do menor elemento."""
+        members = {}
+        for item in self.parent: members.setdefault(self.find(item), []).append(item)
+        return sorted((sorted(group) for group in members.values() if len(group) > 1), key=lambda group: group[0])
+
+
+def overlap_groups(pairs):
+    """Agrupa os fids ligados por pares de sobreposição (componentes conexas)."""
+    components = DisjointSet()
+    for first, second in pairs: components.union(first, second)
+    return components.groups()
+
+
+def _morton_key(x, y):
+    key = 0
+    for bit in range(16): key |= ((x >> bit) & 1) << (2 * bit) | ((y >> bit) & 1) << (2 * bit + 1)
+    return key
+
+
+def spatial_order(geometries):
+    """Ordena as geometrias pela curva Z do centro das caixas envolventes, aproximando vizinhas."""
+    if len(geometries) < 2: return list(geometries)
+    boxes = [geometry.boundingBox() for geometry in geometries]; extent = QgsRectangle(boxes[0])
+    for box in boxes[1:]: extent.combineExtentWith(box)
+    scale_x = 65535 / max(extent.width(), 1e-12); scale_y = 65535 / max(extent.height(), 1e-12)
+    keys = [_morton_key(int((box.center().x() - extent.xMinimum()) * scale_x), int((box.center().y() - extent.yMinimum()) * scale_y)) for box in boxes]
+    return [geometries[i] for i in sorted(range(len(geometries)), key=keys.__getitem__)]
+
+
+def cascaded_union(geometries, progress=None, fanout=UNION_FANOUT):
+    """União em árvore: as geometrias, em ordem espacial, são unidas em grupos de ``fanout`` por nível.
+
+    Cada ``unaryUnion`` recebe poucas geometrias vizinhas, mantendo os resultados
+    intermediários pequenos. ``progress(nível, total de níveis)`` é chamado ao fim
+    de cada nível.
+    """
+    level = spatial_order([geometry for geometry in geometries if not geometry.isNull()])
+    if not level: return QgsGeometry()
+    levels = 1; size = len(level)
+    while size > fanout: size = -(-size // fanout); levels += 1
+    for depth in range(1, levels + 1):
+        level = [QgsGeometry.unaryUnion(level[start:start + fanout]) for start in range(0, len(level), fanout)]
+        if progress is not None: progress(depth, levels)
+    return level[0]
+
+
+def _is_null(value):
+    return value is None or value == NULL
+
+
+def _valid(geometry):
+    return geometry if geometry.isGeosValid() else geometry.makeValid()
+
+
+def cut_priorities(source, fids, rule, priority_field=None):
+    """Chave de prioridade de cada fid: no par, a feição de menor chave mantém a área sobreposta."""
+    if rule == CUT_HIGHER_FID: return {fid: fid for fid in fids}
+    if rule == CUT_PRIORITY:
+        index = source.fields().lookupField(priority_field or "")
+        if index < 0: raise ValueError(f"Campo de prioridade inexistente na camada: {priority_field}")
+        request = QgsFeatureRequest().setFilterFids(list(fids)).setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([index])
+        values = {feature.id(): feature.attribute(index) for feature in source.getFeatures(request)}
+        # valores nulos ficam com a menor prioridade
+        return {fid: (_is_null(value), 0 if _is_null(value) else value, fid) for fid, value in values.items()}
+    sign = -1 if rule == CUT_SMALLER else 1
+    request = QgsFeatureRequest().setFilterFids(list(fids)).setNoAttributes()
+    return {feature.id(): (sign * feature.geometry().area(), feature.id()) for feature in source.getFeatures(request)}
+
+
+def cut_plan(source, pairs, rule=CUT_SMALLER, priority_field=None):
+    """Devolve ``{fid recortado: [fids que mantêm a área]}`` para os pares de sobreposição."""
+    keys = cut_priorities(source, {fid for pair in pairs for fid in pair}, rule, priority_field); plan = {}
+    for first, second in pairs:
+        if first not in keys or second not in keys: continue
+        winner, loser = (first, second) if keys[first] <= keys[second] else (second, first)
+        plan.setdefault(loser, []).append(winner)
+    return plan
+
+
+def _cut_chunk(source, chunk, plan):
+    fids = set(chunk)
+    for loser in chunk: fids.update(plan[loser])
+    geometries = {feature.id(): feature.geometry() for feature in source.getFeatures(QgsFeatureRequest().setFilterFids(list(fids)).setNoAttributes())}
+    cut = []
+    for loser in chunk:
+        winners = [_valid(geometries[fid]) for fid in plan[loser] if fid in geometries]
+        if loser not in geometries or not winners: continue
+        cut.append((loser, _valid(geometries[loser]).difference(QgsGeometry.unaryUnion(winners))))
+    return cut
+
+
+def cut_overlaps(sources, pairs, rule=CUT_SMALLER, priority_field=None, feedback=None, chunk_size=FIX_CHUNK_SIZE):
+    """Recorta de uma feição de cada par a área que ela divide com a outra, preservando todas as feições.
+
+    ``rule`` escolhe quem perde a área (``CUT_SMALLER``, ``CUT_LARGER``,
+    ``CUT_HIGHER_FID`` ou ``CUT_PRIORITY`` com ``priority_field``). Cada feição
+    recortada é comparada apenas com os parceiros dos seus pares, já encontrados
+    pelo índice espacial da validação, usando as geometrias originais; assim os
+    recortes são independentes e os blocos de ``chunk_size`` feições são
+    processados em paralelo, uma fonte de ``sources`` por thread. Gera
+    ``(fid, geometria recortada)``.
+    """
+    plan = cut_plan(sources[0], pairs, rule, priority_field); losers = sorted(plan)
+    chunks = [losers[start:start + chunk_size] for start in range(0, len(losers), chunk_size)]
+    for _, cut in parallel_imap(sources, chunks, lambda source, chunk: _cut_chunk(source, chunk, plan), feedback):
+        yield from cut or ()
+
+
+def aggregation_policies(field):
+    """Políticas que se aplicam ao tipo do campo."""
+    policies = [AGGREGATE_FIRST, AGGREGATE_LARGEST, AGGREGATE_MODE, AGGREGATE_MIN, AGGREGATE_MAX]
+    if field.isNumeric(): policies.insert(1, AGGREGATE_SUM)
+    if field.type() == QVariant.String: policies.append(AGGREGATE_CONCAT)
+    return policies
+
+
+class GroupAggregator:
+    """Combina os atributos das feições de um grupo, campo a campo, à medida que são lidas.
+
+    ``policies`` mapeia nome do campo -> política (``AGGREGATE_*``); campos
+    ausentes usam ``AGGREGATE_FIRST``. Os valores nulos são ignorados, exceto
+    pelas políticas que escolhem uma feição (primeira e maior área).
+    """
+
+    def __init__(self, fields, policies=None):
+        policies = policies or {}; self.policies = []
+        for field in fields:
+            policy = policies.get(field.name(), AGGREGATE_FIRST)
+            if policy not in aggregation_policies(field): raise ValueError(f"A política '{policy}' não se aplica ao campo '{field.name()}'.")
+            self.policies.append(policy)
+        self.reset()
+
+    def reset(self):
+        self.first = None; self.largest = None; self.values = [[] for _ in self.policies]
+
+    def add(self, feature, area):
+        fid = feature.id(); attributes = feature.attributes()
+        if self.first is None or fid < self.first[0]: self.first = (fid, attributes)
+        if self.largest is None or (area, -fid) > (self.largest[0], -self.largest[1]): self.largest = (area, fid, attributes)
+        for values, policy, value in zip(self.values, self.policies, attributes):
+            if policy not in (AGGREGATE_FIRST, AGGREGATE_LARGEST) and not _is_null(value): values.append((fid, value))
+
+    def _aggregate(self, position, policy):
+        if policy == AGGREGATE_FIRST: return self.first[1][position]
+        if policy == AGGREGATE_LARGEST: return self.largest[2][position]
+        values = [value for _, value in sorted(self.values[position], key=lambda item: item[0])]
+        if not values: return NULL
+        if policy == AGGREGATE_SUM: return sum(values)
+        if policy == AGGREGATE_MIN: return min(values)
+        if policy == AGGREGATE_MAX: return max(values)
+        if policy == AGGREGATE_CONCAT: return CONCAT_SEPARATOR.join(str(value) for value in values)
+        counts = Counter(values)
+        return max(values, key=lambda value: counts[value])  # empate: o de menor fid
+
+    def attributes(self):
+        if self.first is None: return []
+        return [self._aggregate(position, policy) for position, policy in enumerate(self.policies)]
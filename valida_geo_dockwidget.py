@@ -2,53 +2,75 @@
 import os, traceback
 
 from qgis.PyQt import QtWidgets, uic
-from qgis.PyQt.QtCore import pyqtSignal
+from qgis.PyQt.QtCore import Qt, pyqtSignal, QThread
 
 from qgis.core import (QgsProject, QgsVectorLayer, Qgis, QgsMessageLog, 
-                       QgsSpatialIndex, QgsFeature, QgsField, QgsFields,
+                       QgsFeature, QgsField, QgsFields,
                        QgsVectorLayerUtils, QgsFeatureRequest, QgsWkbTypes,
-                       QgsGeometry, QgsTask, QgsApplication)
-from qgis import processing
+                       QgsTask, QgsApplication, QgsVectorLayerFeatureSource,
+                       QgsProcessingFeedback)
+
+from .valida_geo_correction import (fixed_geometries, fixed_geometries_parallel, GeometryWriter, output_layer, copy_features, overlap_groups, cascaded_union, cut_overlaps, GroupAggregator,
+                                    aggregation_policies, AGGREGATE_LABELS, CORRECTION_OPTIONS, OVERLAP_DISSOLVE, OVERLAP_CUT, CUT_SMALLER, CUT_LARGER, CUT_HIGHER_FID, CUT_PRIORITY)
+from .valida_geo_engine import (run_checks, layer_snapshot, error_locations_layer, OVERLAP_INTERIOR, OVERLAP_INTERSECTS, DUPLICATE_EXACT,
+                                DUPLICATE_CANONICAL, DUPLICATE_NEAR)
+from .valida_geo_errors import (ErrorStore, ERROR_LABELS, ERROR_TAGS, ERROR_GEOMETRY, ERROR_OVERLAP,
+                                ERROR_DUPLICATE, ERROR_TYPES)
+from .valida_geo_model import ErrorTableModel
+
+def validity_cache_path():
+    return os.path.join(QgsApplication.qgisSettingsDirPath(), 'validageo', 'validity_cache.sqlite')
 
 FORM_CLASS, _ = uic.loadUiType(os.path.join(
     os.path.dirname(__file__), 'valida_geo_dockwidget_base.ui'))
 
 class CorrectionTask(QgsTask):
-    def __init__(self, description, source_layer, errors_to_fix, iface):
+    def __init__(self, description, source_layer, error_store, iface, options=None):
         super().__init__(description, QgsTask.CanCancel)
-        self.source_layer = source_layer; self.errors_to_fix = errors_to_fix; self.iface = iface
-        self.corrected_layer = None; self.summary_message = "Nenhuma correção foi aplicada."; self.exception = None
+        self.options = dict(CORRECTION_OPTIONS, **(options or {})); workers = self.options['workers']; self.source_layer = source_layer; self.source = QgsVectorLayerFeatureSource(source_layer); self.error_store = error_store; self.iface = iface
+        self.worker_sources = [QgsVectorLayerFeatureSource(source_layer) for _ in range(workers)] if workers > 1 else None
+        self.corrected_layer = output_layer(source_layer, f"{source_layer.name()}_corrigida"); self.summary_message = "Nenhuma correção foi aplicada."; self.exception = None; self.feedback = QgsProcessingFeedback()
+    def cancel(self):
+        self.feedback.cancel(); super().cancel()
     def run(self):
         try:
-            fids_to_correct_geometry = self.errors_to_fix['geom']; overlap_pairs = self.errors_to_fix['sobrep_pairs']; fids_to_delete_duplicates = self.errors_to_fix['duplic']
+            fids_to_correct_geometry = self.error_store.fids_of_type(ERROR_GEOMETRY); overlap_pairs = self.error_store.overlap_pairs(); fids_to_delete_duplicates = self.error_store.fids_of_type(ERROR_DUPLICATE)
             corrections_applied_tags = []
-            if fids_to_correct_geometry: corrections_applied_tags.append("geom")
-            if fids_to_delete_duplicates: corrections_applied_tags.append("duplic")
-            if overlap_pairs: corrections_applied_tags.append("sobrep")
-            if not corrections_applied_tags: return True
-            suffix = "_corrigida_" + "_".join(corrections_applied_tags); new_layer_name = f"{self.source_layer.name()}{suffix}"; self.corrected_layer = self.source_layer.clone(); self.corrected_layer.setName(new_layer_name)
-            self.corrected_layer.startEditing()
+            if fids_to_correct_geometry: corrections_applied_tags.append(ERROR_TAGS[ERROR_GEOMETRY])
+            if fids_to_delete_duplicates: corrections_applied_tags.append(ERROR_TAGS[ERROR_DUPLICATE])
+            if overlap_pairs: corrections_applied_tags.append(ERROR_TAGS[ERROR_OVERLAP])
+            if not corrections_applied_tags: self.corrected_layer = None; return True
+            suffix = "_corrigida_" + "_".join(corrections_applied_tags); new_layer_name = f"{self.source_layer.name()}{suffix}"; self.corrected_layer.setName(new_layer_name)
+            # a camada original só é lida; as correções vão para a cópia no GeoPackage temporário
+            fid_map = copy_features(self.source, self.corrected_layer.dataProvider(), self.options['write_batch_size'], self.feedback)
+            if self.isCanceled(): return False
+            overlap_pairs = [(fid_map[first], fid_map[second]) for first, second in overlap_pairs if first in fid_map and second in fid_map]
             total_steps = len(fids_to_correct_geometry) + len(fids_to_delete_duplicates) + len(overlap_pairs)
             current_step = 0; geometries_corrected = 0
             if fids_to_correct_geometry:
-                for fid in fids_to_correct_geometry:
+                writer = GeometryWriter(self.corrected_layer.dataProvider(), self.options['write_batch_size'])
+                codes = self.error_store.geometry_codes()
+                if self.worker_sources is not None: fixes = fixed_geometries_parallel(self.worker_sources, fids_to_correct_geometry, codes, self.feedback)
+                else: fixes = fixed_geometries(self.source, fids_to_correct_geometry, codes)
+                for fid, geom in fixes:
                     if self.isCanceled(): return False
                     current_step += 1
                     if total_steps > 0: self.setProgress(current_step / total_steps * 100)
-                    geom = self.source_layer.getFeature(fid).geometry().makeValid()
-                    if self.corrected_layer.changeGeometry(fid, geom): geometries_corrected += 1
+                    if fid in fid_map: writer.add(fid_map[fid], geom)
+                writer.flush(); geometries_corrected = writer.written
             duplicates_deleted = 0
             if fids_to_delete_duplicates:
                 if self.isCanceled(): return False
                 current_step += len(fids_to_delete_duplicates)
                 if total_steps > 0: self.setProgress(current_step / total_steps * 100)
-                self.corrected_layer.dataProvider().deleteFeatures(fids_to_delete_duplicates)
+                self.corrected_layer.dataProvider().deleteFeatures([fid_map[fid] for fid in fids_to_delete_duplicates if fid in fid_map])
                 duplicates_deleted = len(fids_to_delete_duplicates)
-            overlaps_corrected_groups = self.correct_overlaps(self.corrected_layer, overlap_pairs, current_step, total_steps)
-            if self.isCanceled():
-                self.corrected_layer.rollBack(); return False
-            self.corrected_layer.commitChanges()
-            self.summary_message = f"Correção concluída. Geometrias: {geometries_corrected}. Duplicatas: {duplicates_deleted}. Grupos de sobreposição unidos: {overlaps_corrected_groups}."
+            if self.options['overlap_resolution'] == OVERLAP_CUT:
+                overlaps_summary = f"Feições recortadas: {self.cut_overlaps(self.corrected_layer, overlap_pairs, current_step, total_steps)}."
+            else: overlaps_summary = f"Grupos de sobreposição unidos: {self.correct_overlaps(self.corrected_layer, overlap_pairs, current_step, total_steps)}."
+            if self.isCanceled(): return False
+            self.corrected_layer.updateExtents()
+            self.summary_message = f"Correção concluída. Geometrias: {geometries_corrected}. Duplicatas: {duplicates_deleted}. {overlaps_summary}"
             return True
         except Exception as e:
             self.exception = e; traceback.print_exc(); return False
@@ -61,125 +83,160 @@ class CorrectionTask(QgsTask):
             self.iface.messageBar().pushMessage("Erro", f"Ocorreu um erro na correção: {self.exception}", level=Qgis.Critical, duration=10)
         elif not result:
             self.iface.messageBar().pushMessage("Cancelado", "A tarefa de correção foi cancelada.", level=Qgis.Info, duration=5)
+    def cut_overlaps(self, layer, overlap_pairs, current_step, total_steps):
+        if not overlap_pairs: return 0
+        sources = [QgsVectorLayerFeatureSource(layer) for _ in range(max(self.options['workers'], 1))]
+        writer = GeometryWriter(layer.dataProvider(), self.options['write_batch_size'])
+        for i, (fid, geom) in enumerate(cut_overlaps(sources, overlap_pairs, self.options['cut_rule'], self.options['priority_field'], self.feedback), start=1):
+            if self.isCanceled(): return -1
+            if total_steps > 0 and i % 100 == 0: self.setProgress(min(current_step + i, total_steps) / total_steps * 100)
+            writer.add(fid, geom)
+        writer.flush()
+        return writer.written
     def correct_overlaps(self, layer, overlap_pairs, current_step, total_steps):
         if not overlap_pairs: return 0
-        adj = {};
-        for u, v in overlap_pairs:
-            adj.setdefault(u, []).append(v); adj.setdefault(v, []).append(u)
-        visited = set(); groups = []; nodes = list(adj.keys())
-        for node in nodes:
-            if node not in visited:
-                current_group = []; q = [node]; visited.add(node)
-                while q:
-                    curr = q.pop(0); current_group.append(curr)
-                    for neighbor in adj.get(curr, []):
-                        if neighbor not in visited:
-                            visited.add(neighbor); q.append(neighbor)
-                groups.append(current_group)
+        groups = overlap_groups(overlap_pairs); aggregator = GroupAggregator(layer.fields(), self.options['aggregation'])
         features_to_add = []; fids_to_delete = []
         for i, group_fids in enumerate(groups):
             if self.isCanceled(): return -1
             if total_steps > 0: self.setProgress((current_step + i) / total_steps * 100)
-            if not group_fids: continue
-            fids_to_delete.extend(group_fids); geometries_to_union = []
+            fids_to_delete.extend(group_fids); geometries_to_union = []; aggregator.reset()
             request = QgsFeatureRequest().setFilterFids(group_fids)
-            first_feature_attributes = layer.getFeature(group_fids[0]).attributes()
             for feature in layer.getFeatures(request):
                 geom = feature.geometry()
                 if not geom.isValid():
                     geom = geom.makeValid()
-                geometries_to_union.append(geom)
+                geometries_to_union.append(geom); aggregator.add(feature, geom.area())
             if geometries_to_union:
-                dissolved_geometry = QgsGeometry.unaryUnion(geometries_to_union)
+                level_progress = lambda level, levels, i=i: self.setProgress((current_step + i + level / levels) / total_steps * 100) if total_steps > 0 else None
+                dissolved_geometry = cascaded_union(geometries_to_union, level_progress)
                 new_feature = QgsFeature(layer.fields())
                 new_feature.setGeometry(dissolved_geometry)
-                new_feature.setAttributes(first_feature_attributes)
+                new_feature.setAttributes(aggregator.attributes())
                 features_to_add.append(new_feature)
         if fids_to_delete: layer.dataProvider().deleteFeatures(fids_to_delete)
         if features_to_add: layer.dataProvider().addFeatures(features_to_add)
         return len(groups)
 
+class ValidationTask(QgsTask):
+    def __init__(self, description, layer, checks, options, iface, results_callback):
+        super().__init__(description, QgsTask.CanCancel)
+        self.layer = layer; self.source = QgsVectorLayerFeatureSource(layer); self.checks = checks; self.options = options; self.iface = iface; self.results_callback = results_callback
+        self.worker_sources = [QgsVectorLayerFeatureSource(layer) for _ in range(options.get('workers', 1))] if options.get('workers', 1) > 1 else None
+        self.snapshot = layer_snapshot(layer, options)
+        self.error_store = ErrorStore(); self.exception = None; self.feedback = QgsProcessingFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+    def cancel(self):
+        self.feedback.cancel(); super().cancel()
+    def run(self):
+        try:
+            QgsMessageLog.logMessage(f"Executando verificações {', '.join(ERROR_TAGS[c] for c in self.checks)} para '{self.layer.name()}'", 'ValidaGeo', level=Qgis.Info)
+            run_checks(self.layer, self.checks, self.source, self.feedback, self.error_store, self.options, self.worker_sources, self.snapshot)
+            return not self.isCanceled()
+        except Exception as e:
+            self.exception = e; traceback.print_exc(); return False
+    def finished(self, result):
+        if result:
+            labels = {ERROR_GEOMETRY: "Geometria: Encontrados {} erros.", ERROR_OVERLAP: "Sobreposição: Encontrados {} erros.", ERROR_DUPLICATE: "Duplicatas: Encontradas {} feições duplicadas."}
+            for check in self.checks:
+                count = self.error_store.count(check)
+                path, seconds = self.error_store.stats.get(check, ("Python", 0.0))
+                if count > 0 or check != ERROR_GEOMETRY: self.iface.messageBar().pushMessage("Info", f"{labels[check].format(count)} ({path}, {seconds:.1f} s)", level=Qgis.Info, duration=5)
+            if 'read' in self.error_store.stats: self.iface.messageBar().pushMessage("Info", f"Leitura da camada: {self.error_store.stats['read']:.1f} s", level=Qgis.Info, duration=5)
+            if 'validity_cache' in self.error_store.stats:
+                hits, misses = self.error_store.stats['validity_cache']; self.iface.messageBar().pushMessage("Info", f"Cache de validade: {hits} de {hits + misses} geometrias reaproveitadas.", level=Qgis.Info, duration=5)
+            self.iface.messageBar().pushMessage("Concluído", "Processo de validação finalizado.", level=Qgis.Info, duration=4)
+        elif self.exception:
+            QgsMessageLog.logMessage(f"Erro na tarefa de validação: {self.exception}", 'ValidaGeo', level=Qgis.Critical)
+            self.iface.messageBar().pushMessage("Erro", f"Ocorreu um erro na validação: {self.exception}", level=Qgis.Critical, duration=10)
+        else:
+            self.iface.messageBar().pushMessage("Cancelado", "A tarefa de validação foi cancelada.", level=Qgis.Info, duration=5)
+        self.results_callback(self.error_store if result else None)
+
 class ValidaGeoDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
     closingPlugin = pyqtSignal()
     def __init__(self, iface, parent=None):
         super(ValidaGeoDockWidget, self).__init__(parent)
         self.iface = iface; self.setupUi(self)
         self.validateButton.clicked.connect(self.run_validation_process)
-        self.errorsTableWidget.cellClicked.connect(self.zoom_to_feature_from_table)
-        self.correctAllButton.clicked.connect(self.run_correction_task)
-        self.populate_layer_combobox(); self.correctAllButton.setEnabled(False); self.active_task = None
+        self.error_model = ErrorTableModel(self); self.errorsTableView.setModel(self.error_model)
+        self.errorsTableView.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed); self.errorsTableView.horizontalHeader().setStretchLastSection(True)
+        self.errorsTableView.clicked.connect(self.zoom_to_feature_from_table)
+        self.errorTypeFilterComboBox.addItem("Todos", None)
+        for error_type in ERROR_TYPES: self.errorTypeFilterComboBox.addItem(ERROR_LABELS[error_type], error_type)
+        self.errorTypeFilterComboBox.currentIndexChanged.connect(lambda: self.error_model.set_type_filter(self.errorTypeFilterComboBox.currentData()))
+        self.correctAllButton.clicked.connect(self.run_correction_task); self.errorLocationsButton.clicked.connect(self.show_error_locations)
+        self.duplicateModeComboBox.addItem("Geometria idêntica (WKB)", DUPLICATE_EXACT); self.duplicateModeComboBox.addItem("Forma canônica (ignora ordem e orientação)", DUPLICATE_CANONICAL)
+        self.duplicateModeComboBox.addItem("Quase idêntica (tolerância de distância)", DUPLICATE_NEAR)
+        self.layerComboBox.currentIndexChanged.connect(self.populate_key_fields)
+        self.workersSpinBox.setMaximum(max(QThread.idealThreadCount(), 1))
+        self.overlapModeComboBox.addItem("Apenas interior (ignora vizinhos)", OVERLAP_INTERIOR); self.overlapModeComboBox.addItem("Qualquer contato (intersects)", OVERLAP_INTERSECTS)
+        self.overlapResolutionComboBox.addItem("Dissolver grupos sobrepostos", OVERLAP_DISSOLVE); self.overlapResolutionComboBox.addItem("Recortar a sobreposição (mantém as feições)", OVERLAP_CUT)
+        for label, rule in (("A menor perde a área", CUT_SMALLER), ("A maior perde a área", CUT_LARGER), ("O maior ID perde a área", CUT_HIGHER_FID), ("Campo de prioridade (menor valor mantém)", CUT_PRIORITY)): self.cutRuleComboBox.addItem(label, rule)
+        self.overlapResolutionComboBox.currentIndexChanged.connect(self.update_cut_options); self.cutRuleComboBox.currentIndexChanged.connect(self.update_cut_options); self.update_cut_options()
+        self.populate_layer_combobox(); self.correctAllButton.setEnabled(False); self.errorLocationsButton.setEnabled(False); self.active_task = None; self.error_store = ErrorStore()
     def closeEvent(self, event): self.closingPlugin.emit(); event.accept()
+    def update_cut_options(self):
+        cut = self.overlapResolutionComboBox.currentData() == OVERLAP_CUT
+        self.aggregationTableWidget.setEnabled(not cut); self.cutRuleComboBox.setEnabled(cut); self.cutPriorityFieldComboBox.setEnabled(cut and self.cutRuleComboBox.currentData() == CUT_PRIORITY)
     def populate_layer_combobox(self):
         self.layerComboBox.clear(); layers = QgsProject.instance().mapLayers().values()
         for layer in layers:
             if isinstance(layer, QgsVectorLayer): self.layerComboBox.addItem(layer.name(), layer)
+    def populate_key_fields(self):
+        self.duplicateKeyFieldsComboBox.clear(); self.cutPriorityFieldComboBox.clear(); layer = self.layerComboBox.currentData()
+        if layer is not None: self.duplicateKeyFieldsComboBox.addItems(layer.fields().names()); self.cutPriorityFieldComboBox.addItems(layer.fields().names())
+        self.populate_aggregation_table(layer)
+    def populate_aggregation_table(self, layer):
+        fields = layer.fields() if layer is not None else []; self.aggregationTableWidget.setRowCount(len(fields))
+        for row, field in enumerate(fields):
+            name_item = QtWidgets.QTableWidgetItem(field.name()); name_item.setFlags(name_item.flags() & ~Qt.ItemIsEditable); self.aggregationTableWidget.setItem(row, 0, name_item)
+            policy_combo = QtWidgets.QComboBox()
+            for policy in aggregation_policies(field): policy_combo.addItem(AGGREGATE_LABELS[policy], policy)
+            self.aggregationTableWidget.setCellWidget(row, 1, policy_combo)
     def run_validation_process(self):
         selected_layer = self.layerComboBox.currentData()
         if not selected_layer: self.iface.messageBar().pushMessage("Aviso", "Nenhuma camada vetorial selecionada.", level=Qgis.Warning, duration=3); self.correctAllButton.setEnabled(False); return
-        self.errorsTableWidget.setRowCount(0); check_geometry = self.geometryCheckBox.isChecked(); check_overlaps = self.overlapsCheckBox.isChecked(); check_duplicates = self.duplicatesCheckBox.isChecked()
+        if self.active_task and self.active_task.status() in (QgsTask.Queued, QgsTask.OnHold, QgsTask.Running):
+            self.iface.messageBar().pushMessage("Aviso", "Já existe uma tarefa em execução.", level=Qgis.Warning, duration=3); return
+        self.error_store = ErrorStore(); self.error_model.set_store(self.error_store); checks = []
+        if self.geometryCheckBox.isChecked(): checks.append(ERROR_GEOMETRY)
+        if self.overlapsCheckBox.isChecked(): checks.append(ERROR_OVERLAP)
+        if self.duplicatesCheckBox.isChecked(): checks.append(ERROR_DUPLICATE)
+        if not checks: self.iface.messageBar().pushMessage("Aviso", "Nenhuma verificação selecionada.", level=Qgis.Warning, duration=3); return
         self.iface.messageBar().pushMessage("Info", f"Iniciando validação para a camada: {selected_layer.name()}", level=Qgis.Info, duration=4)
-        if check_geometry: self.validate_geometry(selected_layer)
-        if check_overlaps: self.validate_overlaps(selected_layer)
-        if check_duplicates: self.validate_duplicates(selected_layer)
-        self.iface.messageBar().pushMessage("Concluído", "Processo de validação finalizado.", level=Qgis.Info, duration=4)
-        if self.errorsTableWidget.rowCount() > 0: self.correctAllButton.setEnabled(True)
-        else: self.correctAllButton.setEnabled(False)
-    def validate_geometry(self, layer):
-        QgsMessageLog.logMessage(f"Executando verificação de geometria para '{layer.name()}'", 'ValidaGeo', level=Qgis.Info); params = {'INPUT_LAYER': layer, 'METHOD': 0, 'VALID_OUTPUT': 'memory:','INVALID_OUTPUT': 'memory:','ERROR_OUTPUT': 'memory:'}; result = processing.run("qgis:checkvalidity", params); invalid_layer = result['INVALID_OUTPUT']; error_count = 0
-        for feature in invalid_layer.getFeatures():
-            error_count += 1; row_position = self.errorsTableWidget.rowCount(); self.errorsTableWidget.insertRow(row_position); feature_id = str(feature.id())
-            self.errorsTableWidget.setItem(row_position, 0, QtWidgets.QTableWidgetItem(feature_id)); self.errorsTableWidget.setItem(row_position, 1, QtWidgets.QTableWidgetItem("Geometria Inválida")); self.errorsTableWidget.setItem(row_position, 2, QtWidgets.QTableWidgetItem("A geometria da feição não é válida."))
-        if error_count > 0: self.iface.messageBar().pushMessage("Info", f"Geometria: Encontrados {error_count} erros.", level=Qgis.Info, duration=5)
-    def validate_overlaps(self, layer):
-        QgsMessageLog.logMessage(f"Executando verificação de sobreposições para '{layer.name()}'", 'ValidaGeo', level=Qgis.Info); all_features = {f.id(): f for f in layer.getFeatures()}; index = QgsSpatialIndex(layer.getFeatures()); error_count = 0; reported_pairs = set()
-        for feature_id, feature in all_features.items():
-            candidate_ids = index.intersects(feature.geometry().boundingBox())
-            for candidate_id in candidate_ids:
-                if feature_id >= candidate_id: continue
-                candidate_feature = all_features.get(candidate_id)
-                if not candidate_feature: continue
-                if feature.geometry().intersects(candidate_feature.geometry()):
-                    pair = tuple(sorted((feature_id, candidate_id)));
-                    if pair in reported_pairs: continue
-                    error_count += 1; reported_pairs.add(pair); row_position = self.errorsTableWidget.rowCount(); self.errorsTableWidget.insertRow(row_position)
-                    self.errorsTableWidget.setItem(row_position, 0, QtWidgets.QTableWidgetItem(str(feature_id))); self.errorsTableWidget.setItem(row_position, 1, QtWidgets.QTableWidgetItem("Sobreposição")); self.errorsTableWidget.setItem(row_position, 2, QtWidgets.QTableWidgetItem(f"Sobrepõe a feição ID {candidate_id}"))
-        self.iface.messageBar().pushMessage("Info", f"Sobreposição: Encontrados {error_count} erros.", level=Qgis.Info, duration=5)
-    def validate_duplicates(self, layer):
-        QgsMessageLog.logMessage(f"Executando verificação de duplicatas para '{layer.name()}'", 'ValidaGeo', level=Qgis.Info); geometries_seen = set(); duplicates_to_report = []
-        for feature in layer.getFeatures():
-            geom_wkb = feature.geometry().asWkb()
-            if geom_wkb in geometries_seen: duplicates_to_report.append(feature.id())
-            else: geometries_seen.add(geom_wkb)
-        for fid in duplicates_to_report:
-            row_position = self.errorsTableWidget.rowCount(); self.errorsTableWidget.insertRow(row_position)
-            self.errorsTableWidget.setItem(row_position, 0, QtWidgets.QTableWidgetItem(str(fid))); self.errorsTableWidget.setItem(row_position, 1, QtWidgets.QTableWidgetItem("Duplicata")); self.errorsTableWidget.setItem(row_position, 2, QtWidgets.QTableWidgetItem("A geometria desta feição é idêntica à de uma anterior."))
-        self.iface.messageBar().pushMessage("Info", f"Duplicatas: Encontradas {len(duplicates_to_report)} feições duplicadas.", level=Qgis.Info, duration=5)
-    def zoom_to_feature_from_table(self, row, column):
+        self.validateButton.setEnabled(False); self.correctAllButton.setEnabled(False); self.errorLocationsButton.setEnabled(False)
+        self.active_task = ValidationTask(f"Validando '{selected_layer.name()}'", selected_layer, checks, self.validation_options(), self.iface, self.show_validation_results)
+        QgsApplication.taskManager().addTask(self.active_task)
+    def validation_options(self):
+        return {'overlap_mode': self.overlapModeComboBox.currentData(), 'overlap_min_area': self.overlapMinAreaSpinBox.value(), 'workers': self.workersSpinBox.value(),
+                'duplicate_mode': self.duplicateModeComboBox.currentData(), 'duplicate_grid': self.duplicateGridSpinBox.value(),
+                'duplicate_tolerance': self.duplicateToleranceSpinBox.value(), 'duplicate_key_fields': self.duplicateKeyFieldsComboBox.checkedItems(),
+                'duplicate_key_geometry': self.duplicateKeyGeometryCheckBox.isChecked(), 'duplicate_memory_mb': self.duplicateMemorySpinBox.value(),
+                'sql_pushdown': self.sqlPushdownCheckBox.isChecked(), 'validity_cache': validity_cache_path() if self.validityCacheCheckBox.isChecked() else None}
+    def correction_options(self):
+        return {'write_batch_size': self.writeBatchSpinBox.value(), 'workers': self.workersSpinBox.value(), 'overlap_resolution': self.overlapResolutionComboBox.currentData(),
+                'cut_rule': self.cutRuleComboBox.currentData(), 'priority_field': self.cutPriorityFieldComboBox.currentText() or None,
+                'aggregation': {self.aggregationTableWidget.item(row, 0).text(): self.aggregationTableWidget.cellWidget(row, 1).currentData() for row in range(self.aggregationTableWidget.rowCount())}}
+    def show_validation_results(self, error_store):
+        self.validateButton.setEnabled(True)
+        if error_store is None: self.correctAllButton.setEnabled(False); self.errorLocationsButton.setEnabled(False); return
+        self.error_store = error_store; self.error_model.set_store(error_store)
+        self.correctAllButton.setEnabled(len(error_store) > 0); self.errorLocationsButton.setEnabled(error_store.xs is not None)
+    def show_error_locations(self):
+        layer = self.layerComboBox.currentData()
+        if layer is None or self.error_store.xs is None: return
+        QgsProject.instance().addMapLayer(error_locations_layer(self.error_store, layer.crs(), f"{layer.name()}_locais_erros"))
+    def zoom_to_feature_from_table(self, index):
         layer = self.layerComboBox.currentData();
-        if not layer: return
-        id_item = self.errorsTableWidget.item(row, 0)
-        if not id_item: return
-        try:
-            feature_id = int(id_item.text()); layer.selectByIds([feature_id])
-            self.iface.mapCanvas().zoomToSelected(layer)
-        except (ValueError, TypeError): print(f"Não foi possível converter o ID da feição para número: {id_item.text()}")
+        if not layer or not index.isValid(): return
+        layer.selectByIds([self.error_model.fid(index.row())])
+        self.iface.mapCanvas().zoomToSelected(layer)
     def run_correction_task(self):
         source_layer = self.layerComboBox.currentData()
-        if not source_layer or self.errorsTableWidget.rowCount() == 0:
+        if not source_layer or len(self.error_store) == 0:
             self.iface.messageBar().pushMessage("Aviso", "Nenhuma camada ou nenhum erro na tabela para corrigir.", level=Qgis.Warning, duration=3)
             return
-        errors = {'geom': [], 'sobrep': set(), 'duplic': [], 'sobrep_pairs': []}
-        for row in range(self.errorsTableWidget.rowCount()):
-            try:
-                error_type = self.errorsTableWidget.item(row, 1).text()
-                feature_id = int(self.errorsTableWidget.item(row, 0).text())
-                if error_type == "Geometria Inválida": errors['geom'].append(feature_id)
-                elif error_type == "Duplicata": errors['duplic'].append(feature_id)
-                elif error_type == "Sobreposição":
-                    errors['sobrep'].add(feature_id); description = self.errorsTableWidget.item(row, 2).text(); other_id = int(description.split()[-1]); errors['sobrep'].add(other_id)
-                    errors['sobrep_pairs'].append((feature_id, other_id))
-            except Exception as e:
-                QgsMessageLog.logMessage(f"ERRO ao ler a linha {row} da tabela: {e}", 'ValidaGeo', level=Qgis.Critical)
         task_description = f"Corrigindo '{source_layer.name()}'"
-        self.active_task = CorrectionTask(task_description, source_layer, errors, self.iface)
-        QgsApplication.taskManager().addTask(self.active_task)
\ No newline at end of file
+        self.active_task = CorrectionTask(task_description, source_layer, self.error_store, self.iface, self.correction_options())
+        QgsApplication.taskManager().addTask(self.active_task)
@@ -0,0 +1,775 @@
+# -*- coding: utf-8 -*-
+"""Motor de validação do ValidaGeo, independente da interface gráfica.
+
+As funções deste módulo recebem uma camada (ou uma fonte de feições) e um
+``QgsProcessingFeedback`` opcional e acrescentam os erros a um ``ErrorStore``,
+podendo ser usadas a partir do painel, de tarefas em segundo plano, de scripts
+ou testes.
+"""
+import heapq
+import os
+import struct
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from hashlib import blake2b
+from collections import OrderedDict, namedtuple
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from math import nan, ceil, floor, sqrt
+from queue import Queue
+
+from qgis.core import (Qgis, QgsMessageLog, QgsFeatureRequest, QgsSpatialIndex, QgsGeometry, QgsRectangle,
+                       QgsProcessingFeedback, QgsProcessingMultiStepFeedback, QgsProviderRegistry,
+                       QgsDataSourceUri, QgsDataProvider, QgsVectorLayer, QgsFeature, QgsPointXY)
+
+from .valida_geo_cache import ValidityCache, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_AGE_DAYS
+from .valida_geo_errors import (ErrorStore, ERROR_GEOMETRY, ERROR_OVERLAP, ERROR_DUPLICATE, ERROR_TYPES, ERROR_TAGS,
+                                ERROR_LABELS, VALIDITY_OTHER, classify_validity_message)
+
+PROGRESS_INTERVAL = 1000
+DIGEST_SIZE = 16
+VERIFY_BATCH_SIZE = 10000
+CACHE_BATCH_SIZE = 1000
+
+OVERLAP_INTERIOR = 'interior'
+OVERLAP_INTERSECTS = 'intersects'
+# interiores se intersectam: exclui pares que apenas compartilham limites
+INTERIOR_PATTERN = 'T********'
+
+DUPLICATE_EXACT = 'exact'
+DUPLICATE_CANONICAL = 'canonical'
+DUPLICATE_NEAR = 'near'
+
+PATH_SQL = 'SQL'
+PATH_PYTHON = 'Python'
+
+DEFAULT_OPTIONS = {'overlap_mode': OVERLAP_INTERIOR, 'overlap_min_area': 0.0, 'geometry_cache_size': 50000,
+                   'workers': 1, 'overlap_tiles': 0, 'duplicate_verify': True, 'duplicate_mode': DUPLICATE_EXACT,
+                   'duplicate_grid': 0.0, 'duplicate_tolerance': 0.0, 'duplicate_key_fields': [],
+                   'duplicate_key_geometry': False, 'duplicate_memory_mb': 0, 'sql_pushdown': True,
+                   'validity_chunk_size': 5000, 'validity_cache': None, 'validity_cache_max_entries': DEFAULT_MAX_ENTRIES,
+                   'validity_cache_max_age_days': DEFAULT_MAX_AGE_DAYS, 'fused_scan': True}
+
+
+def _report(feedback, done, total):
+    if total > 0 and done % PROGRESS_INTERVAL == 0: feedback.setProgress(done / total * 100)
+
+
+def log_info(feedback, message):
+    feedback.pushInfo(message); QgsMessageLog.logMessage(message, 'ValidaGeo', level=Qgis.Info)
+
+
+def parallel_imap(sources, items, function, feedback=None):
+    """Aplica ``function(source, item)`` a cada item em um pool de threads, gerando ``(posição, resultado)``.
+
+    Cada tarefa empresta uma das ``sources`` (fontes de feições criadas na thread
+    principal, uma por thread) enquanto executa, de modo que nenhuma fonte é
+    usada por duas threads ao mesmo tempo. Os resultados são gerados na ordem em
+    que ficam prontos, para que um único consumidor os grave sem esperar o fim;
+    tarefas ainda não iniciadas devolvem ``None`` após o cancelamento.
+    """
+    feedback = feedback or QgsProcessingFeedback(); pool = Queue()
+    for source in sources: pool.put(source)
+    def job(item):
+        if feedback.isCanceled(): return None
+        source = pool.get()
+        try: return function(source, item)
+        finally: pool.put(source)
+    with ThreadPoolExecutor(max_workers=max(len(sources), 1)) as executor:
+        futures = {executor.submit(job, item): position for position, item in enumerate(items)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            position = futures.pop(future); feedback.setProgress(done / len(items) * 100)
+            yield position, future.result()
+
+
+def parallel_map(sources, items, function, feedback=None):
+    """Como ``parallel_imap``, devolvendo a lista de resultados na ordem de ``items``."""
+    results = [None] * len(items)
+    for position, result in parallel_imap(sources, items, function, feedback): results[position] = result
+    return results
+
+
+def prepared_engine(geometry):
+    engine = QgsGeometry.createGeometryEngine(geometry.constGet()); engine.prepareGeometry()
+    return engine
+
+
+def validity_error(geometry):
+    """Devolve ``(código, mensagem, x, y)`` do primeiro erro da GEOS, ou ``None`` se a geometria for válida."""
+    if geometry.isNull() or geometry.isGeosValid(): return None
+    errors = geometry.validateGeometry(QgsGeometry.ValidatorGeos)
+    if not errors: return VALIDITY_OTHER, "", nan, nan
+    error = errors[0]; point = error.where() if error.hasWhere() else None
+    return (classify_validity_message(error.what()), error.what(),
+            point.x() if point is not None else nan, point.y() if point is not None else nan)
+
+
+def _invalid_features(features, feedback, cache=None):
+    if cache is not None: return _invalid_features_cached(features, feedback, cache)
+    invalid = []
+    for feature in features:
+        if feedback.isCanceled(): break
+        error = validity_error(feature.geometry())
+        if error is not None: invalid.append((feature.id(),) + error)
+    return invalid
+
+
+def _invalid_features_cached(features, feedback, cache):
+    """Como ``_invalid_features``, consultando o ``ValidityCache`` em lotes antes de chamar a GEOS."""
+    invalid = []; batch = []
+
+    def flush():
+        known = cache.lookup([digest for _, digest, _ in batch]); computed = {}
+        for fid, digest, geometry in batch:
+            if digest in known: error = known[digest]
+            elif digest in computed: error = computed[digest]
+            else: error = computed[digest] = validity_error(geometry)
+            if error is not None: invalid.append((fid,) + tuple(error))
+        cache.store(computed); batch.clear()
+
+    for feature in features:
+        if feedback.isCanceled(): break
+        geometry = feature.geometry()
+        if geometry.isNull(): continue
+        batch.append((feature.id(), geometry_digest(geometry.asWkb()), geometry))
+        if len(batch) >= CACHE_BATCH_SIZE: flush()
+    if batch and not feedback.isCanceled(): flush()
+    return invalid
+
+
+def _append_invalid(store, invalid):
+    for fid, code, message, x, y in invalid: store.append(fid, ERROR_GEOMETRY, x=x, y=y, code=code, message=message)
+
+
+class Checker(ABC):
+    """Verificação alimentada feição a feição por ``scan``.
+
+    ``feed`` recebe cada feição da passada, ``finish`` conclui as fases que
+    dependem de todas as feições e ``close`` libera recursos mesmo após
+    cancelamento. ``seconds`` acumula o tempo gasto pela verificação e
+    ``request``, quando definido, é a requisição que basta à verificação isolada.
+    """
+    request = None
+
+    def __init__(self, store, feedback):
+        self.store = store; self.feedback = feedback; self.seconds = 0.0
+
+    @abstractmethod
+    def feed(self, feature):
+        pass
+
+    def finish(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def scan(source, request, checkers, feedback, total=None):
+    """Lê a fonte uma única vez e entrega cada feição a todos os ``checkers``.
+
+    ``total`` é o número de feições usado no progresso. Uma
+    ``QgsVectorLayerFeatureSource`` não sabe contá-las, por isso o total deve
+    vir da camada, lido na thread principal; sem ele, só uma camada é contada.
+
+    Devolve o tempo de leitura: a duração da passada menos o tempo gasto dentro
+    das verificações (releituras feitas por elas, como a do ``GeometryCache``,
+    contam como tempo da verificação).
+    """
+    if total is None: total = source.featureCount() if isinstance(source, QgsVectorLayer) else 0
+    clock = time.perf_counter; start = clock()
+    try:
+        for i, feature in enumerate(source.getFeatures(request)):
+            if feedback.isCanceled(): break
+            _report(feedback, i, total)
+            for checker in checkers:
+                begin = clock(); checker.feed(feature); checker.seconds += clock() - begin
+        read_seconds = clock() - start - sum(checker.seconds for checker in checkers)
+        for checker in checkers:
+            if feedback.isCanceled(): break
+            begin = clock(); checker.finish(); checker.seconds += clock() - begin
+    finally:
+        for checker in checkers: checker.close()
+    return read_seconds
+
+
+class ValidityChecker(Checker):
+    def __init__(self, store, feedback, cache=None):
+        super().__init__(store, feedback); self.cache = cache; self.batch = []
+
+    def feed(self, feature):
+        if self.cache is None:
+            error = validity_error(feature.geometry())
+            if error is not None: _append_invalid(self.store, [(feature.id(),) + error])
+            return
+        self.batch.append(feature)
+        if len(self.batch) >= CACHE_BATCH_SIZE: self.finish()
+
+    def finish(self):
+        if self.batch: _append_invalid(self.store, _invalid_features_cached(self.batch, self.feedback, self.cache)); self.batch = []
+
+
+def check_geometry(source, feedback=None, store=None, cache=None):
+    """Verifica a validade (GEOS) de cada geometria em uma única passada, sem atributos.
+
+    Apenas os erros são guardados, com a mensagem, o local e o código do problema
+    relatado pela GEOS; nenhuma cópia da camada é criada. Com um ``ValidityCache``,
+    geometrias já vistas não são validadas de novo.
+    """
+    feedback = feedback or QgsProcessingFeedback(); store = store if store is not None else ErrorStore()
+    scan(source, QgsFeatureRequest().setNoAttributes(), [ValidityChecker(store, feedback, cache)], feedback)
+    return store
+
+
+def check_geometry_parallel(sources, feedback=None, store=None, chunk_size=DEFAULT_OPTIONS['validity_chunk_size'], cache=None):
+    """Verifica a validade dividindo os fids em blocos processados por um pool de threads.
+
+    ``sources`` traz uma fonte de feições por thread; os resultados são reunidos
+    na ordem dos fids. Os fids são lidos antes por uma passada sem geometria nem
+    atributos, já que as fontes não oferecem ``allFeatureIds``.
+    """
+    feedback = feedback or QgsProcessingFeedback(); store = store if store is not None else ErrorStore()
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setNoAttributes()
+    fids = sorted(feature.id() for feature in sources[0].getFeatures(request))
+    chunks = [fids[start:start + chunk_size] for start in range(0, len(fids), chunk_size)]
+
+    def validate_chunk(source, chunk):
+        return _invalid_features(source.getFeatures(QgsFeatureRequest().setFilterFids(chunk).setNoAttributes()), feedback, cache)
+
+    for invalid in parallel_map(sources, chunks, validate_chunk, feedback): _append_invalid(store, sorted(invalid or []))
+    return store
+
+
+def error_locations_layer(store, crs, name="Localização dos erros"):
+    """Camada de pontos em memória com os erros que têm localização (p. ex. o ponto de auto-interseção)."""
+    layer = QgsVectorLayer(f'Point?crs={crs.authid()}&field=fid:long&field=tipo:string&field=descricao:string', name, 'memory')
+    features = []
+    for row in range(len(store)):
+        if not store.has_location(row): continue
+        feature = QgsFeature(layer.fields()); feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(store.xs[row], store.ys[row])))
+        feature.setAttributes([store.fids[row], ERROR_LABELS[store.types[row]], store.description(row)]); features.append(feature)
+    layer.dataProvider().addFeatures(features); layer.updateExtents()
+    return layer
+
+
+class GeometryCache:
+    """Cache LRU de geometrias lidas sob demanda, sem atributos.
+
+    Limita a memória da verificação de sobreposições ao tamanho do cache em vez
+    do tamanho da camada; as ausências são buscadas em lote com ``setFilterFids``.
+    """
+
+    def __init__(self, source, capacity):
+        self.source = source; self.capacity = max(capacity, 1); self.geometries = OrderedDict()
+
+    def put(self, fid, geometry):
+        self.geometries[fid] = geometry; self.geometries.move_to_end(fid)
+        if len(self.geometries) > self.capacity: self.geometries.popitem(last=False)
+
+    def get_many(self, fids):
+        found = {}; missing = []
+        for fid in fids:
+            geometry = self.geometries.get(fid)
+            if geometry is None: missing.append(fid)
+            else: found[fid] = geometry; self.geometries.move_to_end(fid)
+        if missing:
+            for feature in self.source.getFeatures(QgsFeatureRequest().setFilterFids(missing).setNoAttributes()):
+                found[feature.id()] = feature.geometry(); self.put(feature.id(), feature.geometry())
+        return found
+
+
+def overlap_test(engine, candidate_geometry, mode=OVERLAP_INTERIOR, min_area=0.0):
+    """Devolve ``None`` se não há sobreposição, ou a área da interseção (``nan`` se não calculada).
+
+    O ``intersects`` preparado descarta rápido os candidatos que só compartilham
+    a caixa envolvente; ``relatePattern`` roda apenas para os que se intersectam.
+    """
+    candidate = candidate_geometry.constGet()
+    if not engine.intersects(candidate): return None
+    if mode == OVERLAP_INTERSECTS: return nan
+    if not engine.relatePattern(candidate, INTERIOR_PATTERN): return None
+    if min_area <= 0: return nan
+    area = QgsGeometry(engine.intersection(candidate)).area()
+    return area if area > min_area else None
+
+
+class OverlapChecker(Checker):
+    def __init__(self, store, feedback, source, mode=OVERLAP_INTERIOR, min_area=0.0, cache_size=DEFAULT_OPTIONS['geometry_cache_size']):
+        super().__init__(store, feedback)
+        self.mode = mode; self.min_area = min_area; self.index = QgsSpatialIndex(); self.cache = GeometryCache(source, cache_size)
+
+    def feed(self, feature):
+        feature_id = feature.id(); geometry = feature.geometry()
+        if geometry.isNull() or geometry.isEmpty(): return
+        candidate_ids = self.index.intersects(geometry.boundingBox())
+        if candidate_ids:
+            # prepara a geometria uma única vez e avalia todos os candidatos contra ela
+            engine = prepared_engine(geometry)
+            for candidate_id, candidate_geometry in self.cache.get_many(candidate_ids).items():
+                area = overlap_test(engine, candidate_geometry, self.mode, self.min_area)
+                if area is not None: self.store.append(min(feature_id, candidate_id), ERROR_OVERLAP, max(feature_id, candidate_id), area=area)
+        self.index.addFeature(feature); self.cache.put(feature_id, geometry)
+
+
+def check_overlaps(source, feedback=None, store=None, mode=OVERLAP_INTERIOR, min_area=0.0, cache_size=DEFAULT_OPTIONS['geometry_cache_size']):
+    """Detecta pares de feições sobrepostas em uma única passada pela fonte.
+
+    O índice espacial é construído de forma incremental: cada feição lida é
+    comparada apenas com as anteriores que já estão no índice, cujas geometrias
+    vêm de um ``GeometryCache`` limitado a ``cache_size`` geometrias.
+
+    No modo ``OVERLAP_INTERIOR`` só são reportados pares cujos interiores se
+    intersectam (vizinhos que apenas se tocam são ignorados) e, se ``min_area``
+    for positivo, cuja área de interseção a supere. ``OVERLAP_INTERSECTS``
+    mantém o critério antigo de qualquer contato.
+    """
+    feedback = feedback or QgsProcessingFeedback(); store = store if store is not None else ErrorStore()
+    scan(source, QgsFeatureRequest().setNoAttributes(), [OverlapChecker(store, feedback, source, mode, min_area, cache_size)], feedback)
+    return store
+
+
+def check_overlaps_tiled(sources, extent, feedback=None, store=None, mode=OVERLAP_INTERIOR, min_area=0.0, tiles_per_side=0):
+    """Detecta sobreposições dividindo a extensão da camada em blocos processados em paralelo.
+
+    ``sources`` traz uma fonte de feições por thread e ``extent`` é a extensão
+    da camada (``layer.extent()``), lida na thread principal. Cada bloco lê
+    apenas as feições que o intersectam e testa os pares localmente; um par que
+    atravessa vários blocos é reportado somente pelo bloco que contém o canto
+    inferior esquerdo da interseção das suas caixas envolventes.
+    """
+    feedback = feedback or QgsProcessingFeedback(); store = store if store is not None else ErrorStore()
+    side = tiles_per_side or max(1, ceil(sqrt(len(sources) * 4)))
+    x_min = extent.xMinimum(); y_min = extent.yMinimum()
+    width = extent.width() / side or 1.0; height = extent.height() / side or 1.0
+
+    def owner(x, y):
+        return min(max(int((x - x_min) / width), 0), side - 1), min(max(int((y - y_min) / height), 0), side - 1)
+
+    def process_tile(source, tile):
+        start = time.perf_counter(); column, row = tile; pairs = []; geometries = {}; boxes = {}; index = QgsSpatialIndex()
+        rect = QgsRectangle(x_min + column * width, y_min + row * height, x_min + (column + 1) * width, y_min + (row + 1) * height)
+        rect.grow(max(width, height) * 1e-9)  # tolera arredondamentos na atribuição do ponto de referência
+        for feature in source.getFeatures(QgsFeatureRequest().setFilterRect(rect).setNoAttributes()):
+            if feedback.isCanceled(): break
+            feature_id = feature.id(); geometry = feature.geometry()
+            if geometry.isNull() or geometry.isEmpty(): continue
+            box = geometry.boundingBox(); engine = None
+            for candidate_id in index.intersects(box):
+                candidate_box = boxes[candidate_id]
+                if owner(max(box.xMinimum(), candidate_box.xMinimum()), max(box.yMinimum(), candidate_box.yMinimum())) != tile: continue
+                if engine is None: engine = prepared_engine(geometry)
+                area = overlap_test(engine, geometries[candidate_id], mode, min_area)
+                if area is not None: pairs.append((min(feature_id, candidate_id), max(feature_id, candidate_id), area))
+            index.addFeature(feature); geometries[feature_id] = geometry; boxes[feature_id] = box
+        return pairs, len(geometries), time.perf_counter() - start
+
+    tiles = [(column, row) for row in range(side) for column in range(side)]
+    results = parallel_map(sources, tiles, process_tile, feedback)
+    if feedback.isCanceled(): return store
+    pairs = []
+    for tile, (tile_pairs, feature_count, elapsed) in zip(tiles, results):
+        pairs.extend(tile_pairs)
+        if feature_count: log_info(feedback, f"Bloco {tile}: {feature_count} feições, {len(tile_pairs)} pares em {elapsed:.2f} s ({feature_count / max(elapsed, 1e-9):.0f} feições/s)")
+    for first, second, area in sorted(pairs): store.append(first, ERROR_OVERLAP, second, area=area)
+    return store
+
+
+def geometry_digest(wkb):
+    return blake2b(wkb, digest_size=DIGEST_SIZE).digest()
+
+
+def canonical_wkb(geometry, grid_size=0.0):
+    """WKB da forma canônica da geometria.
+
+    Ajusta opcionalmente à grade ``grid_size``, reduz multipartes de uma só parte
+    ao tipo simples e normaliza (orientação dos anéis, vértice inicial, ordem de
+    partes e buracos), de modo que a mesma forma digitalizada de outro jeito gere
+    o mesmo WKB.
+    """
+    if grid_size > 0: geometry = geometry.snappedToGrid(grid_size, grid_size)
+    if geometry.isMultipart() and geometry.constGet().numGeometries() == 1: geometry.convertToSingleType()
+    geometry.normalize()
+    return geometry.asWkb()
+
+
+def _duplicate_wkb(canonical, grid_size):
+    if canonical: return lambda geometry: canonical_wkb(geometry, grid_size)
+    return lambda geometry: geometry.asWkb()
+
+
+def _verify_duplicates(source, candidates, feedback, request, key_of):
+    """Confirma pares ``(fid, fid_original)`` comparando as chaves completas, em lotes.
+
+    ``candidates`` pode ser um gerador: apenas ``VERIFY_BATCH_SIZE`` pares ficam
+    em memória de cada vez, e os confirmados são gerados lote a lote.
+    """
+    candidates = iter(candidates)
+    while not feedback.isCanceled():
+        batch = list(islice(candidates, VERIFY_BATCH_SIZE))
+        if not batch: return
+        fids = {fid for pair in batch for fid in pair}
+        keys = {feature.id(): key_of(feature) for feature in source.getFeatures(QgsFeatureRequest(request).setFilterFids(list(fids)))}
+        yield from ((fid, original) for fid, original in batch if keys.get(fid) == keys.get(original))
+
+
+class ExternalDigestSorter:
+    """Ordenação externa de pares (resumo, fid) para camadas maiores que a memória.
+
+    Os pares são acumulados até ``memory_budget`` bytes, ordenados e gravados em
+    arquivos temporários; ``duplicate_pairs`` intercala os arquivos e devolve cada
+    fid cujo resumo repete o de um fid menor. No máximo ``MERGE_FAN_IN`` arquivos
+    ficam abertos ao mesmo tempo: com mais do que isso, eles são intercalados em
+    várias passadas, gravando arquivos intermediários.
+    """
+    RECORD = struct.Struct('>16sQ')
+    RECORD_OVERHEAD = 96  # bytes por registro na lista em memória, incluindo o objeto bytes
+    READ_RECORDS = 4096
+    MERGE_FAN_IN = 64
+    FID_OFFSET = 2 ** 63  # fids negativos continuam ordenados antes dos positivos
+
+    def __init__(self, memory_budget, directory=None):
+        self.capacity = max(memory_budget // self.RECORD_OVERHEAD, 1); self.buffer = []; self.runs = []; self.run_count = 0
+        self.directory = tempfile.TemporaryDirectory(prefix='valida_geo_', dir=directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.buffer = []; self.directory.cleanup()
+
+    def add(self, digest, fid):
+        self.buffer.append(self.RECORD.pack(digest, fid + self.FID_OFFSET))
+        if len(self.buffer) >= self.capacity: self._spill()
+
+    def _run_path(self):
+        self.run_count += 1
+        return os.path.join(self.directory.name, f'run_{self.run_count}.bin')
+
+    def _spill(self):
+        if not self.buffer: return
+        self.buffer.sort(); path = self._run_path()
+        with open(path, 'wb') as run: run.write(b''.join(self.buffer))
+        self.runs.append(path); self.buffer = []
+
+    def _merge_runs(self, paths):
+        """Intercala ``paths`` em um novo arquivo e apaga os originais."""
+        path = self._run_path(); records = heapq.merge(*(self._read_run(run) for run in paths))
+        with open(path, 'wb') as merged:
+            while True:
+                chunk = b''.join(islice(records, self.READ_RECORDS))
+                if not chunk: break
+                merged.write(chunk)
+        for run in paths: os.remove(run)
+        return path
+
+    def _read_run(self, path):
+        size = self.RECORD.size
+        with open(path, 'rb') as run:
+            while True:
+                chunk = run.read(size * self.READ_RECORDS)
+                if not chunk: return
+                for offset in range(0, len(chunk), size): yield chunk[offset:offset + size]
+
+    def duplicate_pairs(self):
+        self._spill()
+        while len(self.runs) > self.MERGE_FAN_IN:
+            self.runs = [self._merge_runs(self.runs[start:start + self.MERGE_FAN_IN]) for start in range(0, len(self.runs), self.MERGE_FAN_IN)]
+        current_digest = None; original = None
+        for record in heapq.merge(*(self._read_run(path) for path in self.runs)):
+            digest, fid = self.RECORD.unpack(record); fid -= self.FID_OFFSET
+            if digest == current_digest: yield fid, original
+            else: current_digest = digest; original = fid
+
+
+class DuplicateChecker(Checker):
+    """Encontra feições cuja chave ``key_of(feature)`` (bytes) repete a de uma anterior.
+
+    Com ``memory_budget`` (bytes) positivo os resumos são ordenados em disco por
+    um ``ExternalDigestSorter`` em vez de mantidos em um dicionário. ``request``
+    é a requisição usada para reler as feições na confirmação dos pares.
+    """
+
+    def __init__(self, store, feedback, source, request, key_of, verify=True, memory_budget=0):
+        super().__init__(store, feedback)
+        self.source = source; self.request = request; self.key_of = key_of; self.verify = verify
+        self.sorter = ExternalDigestSorter(memory_budget) if memory_budget > 0 else None
+        self.first_fid_by_digest = {}; self.candidates = []
+
+    def feed(self, feature):
+        digest = geometry_digest(self.key_of(feature))
+        if self.sorter is not None: self.sorter.add(digest, feature.id()); return
+        original = self.first_fid_by_digest.setdefault(digest, feature.id())
+        if original != feature.id(): self.candidates.append((feature.id(), original))
+
+    def finish(self):
+        # os pares do disco são consumidos em fluxo, sem materializar a lista
+        candidates = self.sorter.duplicate_pairs() if self.sorter is not None else self.candidates
+        self.first_fid_by_digest = {}
+        duplicates = _verify_duplicates(self.source, candidates, self.feedback, self.request, self.key_of) if self.verify else candidates
+        for fid, original in duplicates: self.store.append(fid, ERROR_DUPLICATE, original)
+
+    def close(self):
+        if self.sorter is not None: self.sorter.close()
+
+
+def check_duplicates(source, feedback=None, store=None, verify=True, canonical=False, grid_size=0.0, memory_budget=0):
+    """Detecta geometrias idênticas guardando apenas um resumo blake2b de 128 bits por geometria.
+
+    A memória deixa de ser proporcional ao tamanho das geometrias. Com ``verify``
+    os pares com o mesmo resumo são confirmados comparando os WKB completos.
+    Com ``canonical`` o resumo é calculado sobre ``canonical_wkb``, ainda em uma
+    única passada. ``memory_budget`` (bytes) ativa a ordenação externa em disco.
+    """
+    feedback = feedback or QgsProcessingFeedback(); store = store if store is not None else ErrorStore()
+    request = QgsFeatureRequest().setNoAttributes(); wkb_of = _duplicate_wkb(canonical, grid_size)
+    scan(source, request, [DuplicateChecker(store, feedback, source, request, lambda feature: wkb_of(feature.geometry()), verify, memory_budget)], feedback)
+    return store
+
+
+def attribute_key(source, key_fields, include_geometry=False):
+    """Devolve ``(índices, requisição, key_of)`` para comparar registros pelos campos ``key_fields``."""
+    fields = source.fields(); indices = [fields.lookupField(name) for name in key_fields]
+    if any(index < 0 for index in indices): raise ValueError(f"Campos inexistentes na camada: {key_fields}")
+    request = QgsFeatureRequest().setSubsetOfAttributes(indices)
+    # setFlags substitui as flags: preserva o SubsetOfAttributes definido acima
+    if not include_geometry: request.setFlags(request.flags() | QgsFeatureRequest.NoGeometry)
+
+    def key_of(feature):
+        key = repr([feature.attribute(index) for index in indices]).encode()
+        return key + feature.geometry().asWkb() if include_geometry else key
+
+    return indices, request, key_of
+
+
+def check_attribute_duplicates(source, key_fields, feedback=None, store=None, include_geometry=False, verify=True, memory_budget=0):
+    """Detecta registros duplicados pelos valores dos campos ``key_fields`` (e, opcionalmente, da geometria).
+
+    A leitura busca apenas as colunas da chave e dispensa a geometria quando ela
+    não faz parte da chave.
+    """
+    feedback = feedback or QgsProcessingFeedback(); store = store if store is not None else ErrorStore()
+    _, request, key_of = attribute_key(source, key_fields, include_geometry)
+    scan(source, request, [DuplicateChecker(store, feedback, source, request, key_of, verify, memory_budget)], feedback)
+    return store
+
+
+class NearDuplicateChecker(Checker):
+    def __init__(self, store, feedback, source, tolerance, cache_size=DEFAULT_OPTIONS['geometry_cache_size']):
+        super().__init__(store, feedback)
+        self.tolerance = tolerance; self.grid = {}; self.cache = GeometryCache(source, cache_size)
+
+    def feed(self, feature):
+        geometry = feature.geometry(); tolerance = self.tolerance
+        if geometry.isNull() or geometry.isEmpty(): return
+        box = geometry.boundingBox(); bounds = (box.xMinimum(), box.yMinimum(), box.xMaximum(), box.yMaximum())
+        cell_x = floor((bounds[0] + bounds[2]) / 2 / tolerance); cell_y = floor((bounds[1] + bounds[3]) / 2 / tolerance)
+        candidates = [fid for dx in (-1, 0, 1) for dy in (-1, 0, 1) for fid, other in self.grid.get((cell_x + dx, cell_y + dy), ())
+                      if all(abs(a - b) <= tolerance for a, b in zip(bounds, other))]
+        original = None
+        if candidates:
+            for candidate_id, candidate_geometry in sorted(self.cache.get_many(candidates).items()):
+                # hausdorffDistance devolve -1 quando o cálculo falha
+                if 0 <= geometry.hausdorffDistance(candidate_geometry) <= tolerance: original = candidate_id; break
+        if original is not None: self.store.append(feature.id(), ERROR_DUPLICATE, original); return
+        self.grid.setdefault((cell_x, cell_y), []).append((feature.id(), bounds)); self.cache.put(feature.id(), geometry)
+
+
+def check_near_duplicates(source, feedback=None, store=None, tolerance=0.0, cache_size=DEFAULT_OPTIONS['geometry_cache_size']):
+    """Detecta feições quase idênticas, deslocadas no máximo ``tolerance`` unidades.
+
+    O centro da caixa envolvente de cada feição é indexado em uma grade de células
+    de lado ``tolerance``; como a distância de Hausdorff limita o deslocamento de
+    cada lado da caixa, basta comparar as 9 células vizinhas. Os candidatos que
+    passam pelo teste das caixas são confirmados pela distância de Hausdorff.
+    """
+    feedback = feedback or QgsProcessingFeedback(); store = store if store is not None else ErrorStore()
+    if tolerance <= 0: return check_duplicates(source, feedback, store)
+    scan(source, QgsFeatureRequest().setNoAttributes(), [NearDuplicateChecker(store, feedback, source, tolerance, cache_size)], feedback)
+    return store
+
+
+SqlTarget = namedtuple('SqlTarget', ['connection', 'table', 'geometry_column', 'key_column', 'geometry_expression'])
+LayerSnapshot = namedtuple('LayerSnapshot', ['feature_count', 'extent', 'sql_target'])
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _single_sublayer(layer):
+    """Nome da única tabela do arquivo, para GeoPackages abertos pelo caminho (sem ``layername``)."""
+    sublayers = layer.dataProvider().subLayers()
+    if len(sublayers) != 1: return None
+    parts = sublayers[0].split(QgsDataProvider.sublayerSeparator())
+    return parts[1] if len(parts) > 1 else None
+
+
+def sql_target(layer):
+    """Descreve como consultar a camada por SQL, ou devolve ``None`` se ela não for GeoPackage/SpatiaLite.
+
+    Camadas com filtro (``subsetString``) não são elegíveis, pois a consulta
+    leria a tabela inteira, nem camadas com edições não salvas, que a consulta
+    não enxergaria.
+    """
+    provider = layer.providerType()
+    if layer.subsetString() or (layer.isEditable() and layer.isModified()): return None
+    if provider == 'ogr' and layer.dataProvider().storageType() == 'GPKG':
+        parts = QgsProviderRegistry.instance().decodeUri('ogr', layer.source())
+        uri = parts.get('path'); table = parts.get('layerName') or _single_sublayer(layer)
+    elif provider == 'spatialite':
+        data_source = QgsDataSourceUri(layer.source()); uri = layer.source(); table = data_source.table()
+    else: return None
+    if not uri or not table: return None
+    connection = QgsProviderRegistry.instance().providerMetadata(provider).createConnection(uri, {})
+    properties = connection.table('', table); geometry_column = properties.geometryColumn()
+    key_columns = properties.primaryKeyColumns()
+    key_column = key_columns[0] if len(key_columns) == 1 else 'ROWID'
+    geometry_expression = f'GeomFromGPB({_quote(geometry_column)})' if provider == 'ogr' else _quote(geometry_column)
+    return SqlTarget(connection, table, geometry_column, key_column, geometry_expression)
+
+
+def layer_snapshot(layer, options=None):
+    """Lê da camada o que as verificações precisam e as fontes de feições não oferecem.
+
+    Deve ser chamada na thread principal, antes de a tarefa ir para segundo
+    plano: além da contagem e da extensão, resolve o ``sql_target`` usado pelas
+    consultas SQL quando ``options`` as permite.
+    """
+    options = dict(DEFAULT_OPTIONS, **(options or {})); target = None
+    if options['sql_pushdown']:
+        try: target = sql_target(layer)
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Consulta SQL indisponível para '{layer.name()}', usando Python: {e}", 'ValidaGeo', level=Qgis.Info)
+    return LayerSnapshot(layer.featureCount(), layer.extent(), target)
+
+
+def sql_check_validity(target, store):
+    """Validade via ``ST_IsValid`` da SpatiaLite, executada no próprio banco, com motivo e local do erro."""
+    geometry = target.geometry_expression
+    sql = (f'SELECT {_quote(target.key_column)}, ST_IsValidReason({geometry}), ST_X(ST_IsValidDetail({geometry})), '
+           f'ST_Y(ST_IsValidDetail({geometry})) FROM {_quote(target.table)} '
+           f'WHERE {_quote(target.geometry_column)} IS NOT NULL AND ST_IsValid({geometry}) = 0')
+    for fid, reason, x, y in target.connection.executeSql(sql):
+        reason = reason or ""
+        store.append(int(fid), ERROR_GEOMETRY, x=nan if x is None else float(x), y=nan if y is None else float(y),
+                     code=classify_validity_message(reason), message=reason)
+    return store
+
+
+def sql_check_duplicates(target, store, key_columns=None):
+    """Duplicatas via ``GROUP BY`` no blob da geometria (ou nas colunas ``key_columns``)."""
+    key = _quote(target.key_column); table = _quote(target.table)
+    columns = [_quote(c) for c in (key_columns or [target.geometry_column])]
+    join = ' AND '.join(f't.{c} IS d.{c}' for c in columns)
+    sql = (f'SELECT t.{key}, d.original FROM {table} t JOIN '
+           f'(SELECT {", ".join(columns)}, MIN({key}) AS original FROM {table} GROUP BY {", ".join(columns)} HAVING COUNT(*) > 1) d '
+           f'ON {join} WHERE t.{key} <> d.original ORDER BY t.{key}')
+    for fid, original in target.connection.executeSql(sql): store.append(int(fid), ERROR_DUPLICATE, int(original))
+    return store
+
+
+def _run_pushdown(layer, target, check, options, store, feedback):
+    """Tenta executar a verificação por SQL em ``target``; devolve ``False`` para usar o caminho em Python."""
+    if target is None or not options['sql_pushdown'] or check == ERROR_OVERLAP: return False
+    if check == ERROR_DUPLICATE and not options['duplicate_key_fields'] and options['duplicate_mode'] != DUPLICATE_EXACT: return False
+    try:
+        partial = ErrorStore()
+        if check == ERROR_GEOMETRY: sql_check_validity(target, partial)
+        elif options['duplicate_key_fields']:
+            key_columns = list(options['duplicate_key_fields']) + ([target.geometry_column] if options['duplicate_key_geometry'] else [])
+            sql_check_duplicates(target, partial, key_columns)
+        else: sql_check_duplicates(target, partial)
+    except Exception as e:
+        log_info(feedback, f"Consulta SQL indisponível para '{layer.name()}', usando Python: {e}")
+        return False
+    store.extend(partial)
+    return True
+
+
+def run_checks(layer, checks, source=None, feedback=None, store=None, options=None, worker_sources=None, snapshot=None):
+    """Executa as verificações pedidas em ``checks`` e devolve o ``ErrorStore`` preenchido.
+
+    ``source`` permite ler as feições a partir de uma ``QgsVectorLayerFeatureSource``
+    criada na thread principal quando a execução ocorre em segundo plano.
+    ``worker_sources`` traz uma fonte por thread para as verificações paralelas,
+    usadas quando houver mais de uma. ``snapshot`` é o ``layer_snapshot`` da
+    camada, tirado na thread principal; sem ele, é lido da camada na hora.
+    ``options`` sobrescreve as chaves de ``DEFAULT_OPTIONS``.
+
+    As verificações que não são resolvidas por SQL nem em paralelo compartilham,
+    com ``fused_scan``, uma única passada pela fonte; o tempo de leitura fica em
+    ``store.stats['read']`` e o de cada verificação em ``store.stats[check]``.
+    """
+    feedback = feedback or QgsProcessingFeedback(); source = source if source is not None else layer; store = store if store is not None else ErrorStore()
+    options = dict(DEFAULT_OPTIONS, **(options or {})); snapshot = snapshot if snapshot is not None else layer_snapshot(layer, options)
+    checks = [c for c in ERROR_TYPES if c in checks]; partials = {check: ErrorStore() for check in checks}; python_checks = []
+    for check in checks:
+        if feedback.isCanceled(): break
+        start = time.perf_counter()
+        if _run_pushdown(layer, snapshot.sql_target, check, options, partials[check], feedback): _record_stats(feedback, partials[check], check, PATH_SQL, time.perf_counter() - start)
+        else: python_checks.append(check)
+    parallel = worker_sources is not None and len(worker_sources) > 1
+    parallel_checks = [c for c in python_checks if parallel and c != ERROR_DUPLICATE]; serial_checks = [c for c in python_checks if c not in parallel_checks]
+    groups = [[c] for c in parallel_checks] + ([serial_checks] if options['fused_scan'] and serial_checks else [[c] for c in serial_checks])
+    multi_feedback = QgsProcessingMultiStepFeedback(max(len(groups), 1), feedback)
+    cache = _open_validity_cache(options) if ERROR_GEOMETRY in python_checks else None
+    try:
+        for step, group in enumerate(groups):
+            if feedback.isCanceled(): break
+            multi_feedback.setCurrentStep(step); start = time.perf_counter()
+            if group[0] in parallel_checks:
+                _run_parallel_check(worker_sources, snapshot, group[0], options, multi_feedback, partials[group[0]], cache)
+                _record_stats(feedback, partials[group[0]], group[0], PATH_PYTHON, time.perf_counter() - start); continue
+            read_seconds, check_seconds = scan_checks(source, group, options, multi_feedback, partials, cache, snapshot.feature_count)
+            store.stats['read'] = store.stats.get('read', 0.0) + read_seconds
+            log_info(feedback, f"Leitura de {', '.join(ERROR_TAGS[c] for c in group)} em uma passada: {read_seconds:.2f} s")
+            for check in group: _record_stats(feedback, partials[check], check, PATH_PYTHON, check_seconds[check])
+    finally:
+        if cache is not None:
+            store.stats['validity_cache'] = (cache.hits, cache.misses); log_info(feedback, cache.summary()); cache.close()
+    for check in checks: store.extend(partials[check])
+    return store
+
+
+def _record_stats(feedback, store, check, path, seconds):
+    store.stats[check] = (path, seconds)
+    log_info(feedback, f"Verificação '{ERROR_TAGS[check]}': caminho {path}, {seconds:.2f} s")
+
+
+def _open_validity_cache(options):
+    if not options['validity_cache']: return None
+    return ValidityCache(options['validity_cache'], Qgis.geosVersion(), options['validity_cache_max_entries'], options['validity_cache_max_age_days'])
+
+
+def _run_parallel_check(worker_sources, snapshot, check, options, feedback, store, cache):
+    if check == ERROR_GEOMETRY: check_geometry_parallel(worker_sources, feedback, store, options['validity_chunk_size'], cache)
+    else: check_overlaps_tiled(worker_sources, snapshot.extent, feedback, store, options['overlap_mode'], options['overlap_min_area'], options['overlap_tiles'])
+
+
+def scan_checks(source, checks, options, feedback, stores, cache=None, total=None):
+    """Executa ``checks`` em uma única passada pela fonte, cada uma gravando em ``stores[check]``.
+
+    Devolve ``(segundos de leitura, {verificação: segundos})``.
+    """
+    checkers = {}; attributes = []
+    for check in checks:
+        store = stores[check]
+        if check == ERROR_GEOMETRY: checkers[check] = ValidityChecker(store, feedback, cache)
+        elif check == ERROR_OVERLAP: checkers[check] = OverlapChecker(store, feedback, source, options['overlap_mode'], options['overlap_min_area'], options['geometry_cache_size'])
+        elif options['duplicate_key_fields']:
+            attributes, request, key_of = attribute_key(source, options['duplicate_key_fields'], options['duplicate_key_geometry'])
+            checkers[check] = DuplicateChecker(store, feedback, source, request, key_of, options['duplicate_verify'], int(options['duplicate_memory_mb'] * 2 ** 20))
+        elif options['duplicate_mode'] == DUPLICATE_NEAR and options['duplicate_tolerance'] > 0:
+            checkers[check] = NearDuplicateChecker(store, feedback, source, options['duplicate_tolerance'], options['geometry_cache_size'])
+        else:
+            request = QgsFeatureRequest().setNoAttributes(); wkb_of = _duplicate_wkb(options['duplicate_mode'] == DUPLICATE_CANONICAL, options['duplicate_grid'])
+            checkers[check] = DuplicateChecker(store, feedback, source, request, lambda feature: wkb_of(feature.geometry()),
+                                               options['duplicate_verify'], int(options['duplicate_memory_mb'] * 2 ** 20))
+    request = QgsFeatureRequest().setSubsetOfAttributes(attributes) if attributes else QgsFeatureRequest().setNoAttributes()
+    if len(checkers) == 1 and checkers[checks[0]].request is not None: request = checkers[checks[0]].request
+    read_seconds = scan(source, request, list(checkers.values()), feedback, total)
+    return read_seconds, {check: checker.seconds for check, checker in checkers.items()}
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Armazenamento colunar dos erros encontrados pela validação.
+
+Cada erro ocupa uma posição em arrays compactos (fid, código do tipo, fid
+parceiro e, opcionalmente, localização, área e código do problema de
+validade), evitando um objeto Python por erro. O mesmo armazenamento alimenta a tabela do painel e a ``CorrectionTask``.
+"""
+from array import array
+from math import nan, isnan
+
+ERROR_GEOMETRY = 0
+ERROR_OVERLAP = 1
+ERROR_DUPLICATE = 2
+ERROR_TYPES = (ERROR_GEOMETRY, ERROR_OVERLAP, ERROR_DUPLICATE)
+ERROR_LABELS = {ERROR_GEOMETRY: "Geometria Inválida", ERROR_OVERLAP: "Sobreposição", ERROR_DUPLICATE: "Duplicata"}
+ERROR_TAGS = {ERROR_GEOMETRY: 'geom', ERROR_OVERLAP: 'sobrep', ERROR_DUPLICATE: 'duplic'}
+
+NO_PARTNER = -1
+
+# problemas de validade relatados pela GEOS, usados para escolher a correção
+VALIDITY_OTHER = 0
+VALIDITY_SELF_INTERSECTION = 1
+VALIDITY_REPEATED_POINT = 2
+VALIDITY_TOO_FEW_POINTS = 3
+VALIDITY_RING_NOT_CLOSED = 4
+VALIDITY_NESTED_RINGS = 5
+VALIDITY_INVALID_COORDINATE = 6
+VALIDITY_MESSAGES = (('ring self-intersection', VALIDITY_SELF_INTERSECTION), ('self-intersection', VALIDITY_SELF_INTERSECTION),
+                     ('repeated point', VALIDITY_REPEATED_POINT), ('duplicate node', VALIDITY_REPEATED_POINT),
+                     ('too few points', VALIDITY_TOO_FEW_POINTS), ('not closed', VALIDITY_RING_NOT_CLOSED),
+                     ('hole lies outside', VALIDITY_NESTED_RINGS), ('nested', VALIDITY_NESTED_RINGS),
+                     ('interior is disconnected', VALIDITY_NESTED_RINGS), ('duplicate rings', VALIDITY_NESTED_RINGS),
+                     ('invalid coordinate', VALIDITY_INVALID_COORDINATE))
+
+
+def classify_validity_message(message):
+    message = message.lower()
+    for text, code in VALIDITY_MESSAGES:
+        if text in message: return code
+    return VALIDITY_OTHER
+
+
+def _is_default(value, default):
+    return isnan(value) if isinstance(default, float) else value == default
+
+
+class ErrorStore:
+    OPTIONAL_COLUMNS = {'xs': ('d', nan), 'ys': ('d', nan), 'areas': ('d', nan), 'codes': ('b', VALIDITY_OTHER)}
+
+    def __init__(self):
+        self.fids = array('q'); self.types = array('b'); self.partners = array('q')
+        self.xs = None; self.ys = None; self.areas = None; self.codes = None
+        self.messages = {}  # linha -> mensagem do validador, apenas para erros de geometria
+        self.stats = {}  # tipo de erro -> (caminho, segundos); 'read' -> segundos de leitura; 'validity_cache' -> (acertos, falhas)
+
+    def __len__(self):
+        return len(self.fids)
+
+    def _empty_column(self, name, size):
+        typecode, default = self.OPTIONAL_COLUMNS[name]
+        return array(typecode, [default]) * size
+
+    def _set_optional(self, name, value):
+        column = getattr(self, name)
+        if column is None:
+            if _is_default(value, self.OPTIONAL_COLUMNS[name][1]): return
+            column = self._empty_column(name, len(self.fids) - 1); setattr(self, name, column)
+        column.append(value)
+
+    def append(self, fid, error_type, partner_fid=NO_PARTNER, x=nan, y=nan, area=nan, code=VALIDITY_OTHER, message=None):
+        self.fids.append(fid); self.types.append(error_type); self.partners.append(partner_fid)
+        self._set_optional('xs', x); self._set_optional('ys', y); self._set_optional('areas', area); self._set_optional('codes', code)
+        if message: self.messages[len(self.fids) - 1] = message
+
+    def extend(self, other):
+        size = len(self)
+        self.fids.extend(other.fids); self.types.extend(other.types); self.partners.extend(other.partners); self.stats.update(other.stats)
+        self.messages.update((size + row, message) for row, message in other.messages.items())
+        for name in self.OPTIONAL_COLUMNS:
+            mine = getattr(self, name); theirs = getattr(other, name)
+            if mine is None and theirs is None: continue
+            if mine is None: mine = self._empty_column(name, size); setattr(self, name, mine)
+            mine.extend(theirs if theirs is not None else self._empty_column(name, len(other)))
+
+    def clear(self):
+        self.__init__()
+
+    def value(self, name, row):
+        column = getattr(self, name)
+        return self.OPTIONAL_COLUMNS[name][1] if column is None else column[row]
+
+    def has_location(self, row):
+        return not isnan(self.value('xs', row)) and not isnan(self.value('ys', row))
+
+    def geometry_codes(self):
+        """Código do problema de validade de cada fid com erro de geometria."""
+        return {self.fids[row]: self.value('codes', row) for row, t in enumerate(self.types) if t == ERROR_GEOMETRY}
+
+    def count(self, error_type):
+        return self.types.count(error_type)
+
+    def fids_of_type(self, error_type):
+        return [fid for fid, t in zip(self.fids, self.types) if t == error_type]
+
+    def overlap_pairs(self):
+        return [(fid, partner) for fid, t, partner in zip(self.fids, self.types, self.partners) if t == ERROR_OVERLAP]
+
+    def description(self, row):
+        error_type = self.types[row]
+        if error_type == ERROR_GEOMETRY:
+            message = self.messages.get(row)
+            return f"Geometria inválida: {message}" if message else "A geometria da feição não é válida."
+        if error_type == ERROR_OVERLAP:
+            area = self.value('areas', row)
+            if isnan(area): return f"Sobrepõe a feição ID {self.partners[row]}"
+            return f"Sobrepõe a feição ID {self.partners[row]} (área {area:.2f})"
+        if self.partners[row] != NO_PARTNER: return f"A geometria desta feição coincide com a da feição ID {self.partners[row]}."
+        return "A geometria desta feição é idêntica à de uma anterior."
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Modelo de tabela virtualizado sobre o ``ErrorStore``.
+
+As células são geradas sob demanda em ``data()``; ordenação e filtro por tipo
+mantêm apenas um array com a ordem das linhas do armazenamento, sem copiar os
+erros nem criar um item Qt por célula.
+"""
+from array import array
+
+from qgis.PyQt.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from .valida_geo_errors import ErrorStore, ERROR_LABELS
+
+
+class ErrorTableModel(QAbstractTableModel):
+    HEADERS = ("ID da Feição", "Tipo de Erro", "Descrição")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = ErrorStore(); self.rows = array('q'); self.type_filter = None
+        self.sort_column = None; self.sort_order = Qt.AscendingOrder
+
+    def set_store(self, store):
+        self.beginResetModel()
+        self.store = store; self._rebuild_rows()
+        self.endResetModel()
+
+    def set_type_filter(self, error_type):
+        self.beginResetModel()
+        self.type_filter = error_type; self._rebuild_rows()
+        self.endResetModel()
+
+    def _rebuild_rows(self):
+        if self.type_filter is None: self.rows = array('q', range(len(self.store)))
+        else: self.rows = array('q', (i for i, t in enumerate(self.store.types) if t == self.type_filter))
+        if self.sort_column is not None: self._sort_rows()
+
+    def _sort_rows(self):
+        fids = self.store.fids; types = self.store.types
+        if self.sort_column == 0: key = fids.__getitem__
+        elif self.sort_column == 1: key = lambda i: (types[i], fids[i])
+        else: key = lambda i: (self.store.description(i), fids[i])  # o texto exibido, gerado só ao ordenar por esta coluna
+        self.rows = array('q', sorted(self.rows, key=key, reverse=self.sort_order == Qt.DescendingOrder))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self.sort_column = column; self.sort_order = order; self._sort_rows()
+        self.layoutChanged.emit()
+
+    def store_row(self, row):
+        return self.rows[row]
+
+    def fid(self, row):
+        return self.store.fids[self.rows[row]]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole: return None
+        row = self.rows[index.row()]; column = index.column()
+        if column == 0: return str(self.store.fids[row])
+        if column == 1: return ERROR_LABELS[self.store.types[row]]
+        return self.store.description(row)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal: return self.HEADERS[section]
+        return super().headerData(section, orientation, role)